@@ -0,0 +1,122 @@
+import argparse
+import glob
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, TextIO
+
+import setchecker
+from filters import Has
+from setchecker import (
+    configure_pool,
+    count_sets,
+    fetch_deck_copies,
+    my_logger,
+    read_deck,
+    use_snapshot,
+)
+from setcover import recommend_sets
+
+# Card names resolved per fetch_deck_copies call.
+CHUNK_SIZE = 2000
+
+
+def deck_paths(source: str) -> List[str]:
+    """
+    Returns the deck files of a directory (every .txt file, sorted) or of a manifest listing one deck path per
+    line, relative paths in a manifest are relative to the manifest itself.
+    """
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, "*.txt")))
+
+    base = os.path.dirname(source)
+    with open(source, "r") as f:
+        return [
+            os.path.join(base, line.strip())
+            for line in f
+            if line.strip() and not line.startswith("#")
+        ]
+
+
+def analyze_decks(
+    paths: List[str], workers: int = 1, exact: Optional[bool] = None
+) -> Iterator[Dict]:
+    """
+    Analyzes many decks at once. Every deck is parsed first, the card names are deduplicated across decks and
+    the printings of each unique card are fetched once, then each deck's set counts are built from the shared
+    printings. Yields one result Dict per deck, in the order of paths.
+    """
+    if workers > setchecker.POOL_MAX_CONNECTIONS:
+        configure_pool(workers)
+
+    decks = {}
+    for path in paths:
+        try:
+            decks[path] = read_deck(path)
+        except (AssertionError, OSError, ValueError) as e:
+            decks[path] = e
+
+    card_names = list(
+        dict.fromkeys(
+            card_name
+            for deck_data in decks.values()
+            if not isinstance(deck_data, Exception)
+            for _, card_name in deck_data
+        )
+    )
+    my_logger.info(f"Resolving {len(card_names)} unique cards for {len(paths)} decks")
+
+    copies = {}
+    for start in range(0, len(card_names), CHUNK_SIZE):
+        copies.update(
+            fetch_deck_copies(
+                card_names[start : start + CHUNK_SIZE],
+                workers=workers,
+                card_filter=~Has("types", "Land"),
+            )
+        )
+
+    for path, deck_data in decks.items():
+        if isinstance(deck_data, Exception):
+            yield {"Deck": path, "Error": str(deck_data)}
+            continue
+
+        set_counts = {}
+        for _, card_name in deck_data:
+            count_sets(copies[card_name], set_counts)
+
+        recommendation = recommend_sets(set_counts, deck_data, exact=exact)
+        yield {
+            "Deck": path,
+            "Sets": {set_code: value["Count"] for set_code, value in set_counts.items()},
+            "Recommendation": recommendation["Sets"],
+            "Uncovered": recommendation["Uncovered"],
+        }
+
+
+def write_results(results: Iterator[Dict], output: TextIO):
+    """
+    Writes every result as a JSON line as soon as it is available.
+    """
+    for result in results:
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyzes a directory or manifest of deck files.")
+    parser.add_argument("source", help="directory with .txt deck files, or a manifest with one deck path per line")
+    parser.add_argument("--output", help="JSON lines file to write, defaults to stdout")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--snapshot", help="read from a snapshot directory instead of the database")
+    parser.add_argument("--exact", action=argparse.BooleanOptionalAction, default=None)
+    args = parser.parse_args()
+
+    use_snapshot(args.snapshot)
+    results = analyze_decks(deck_paths(args.source), workers=args.workers, exact=args.exact)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            write_results(results, output)
+    else:
+        write_results(results, sys.stdout)
@@ -0,0 +1,470 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import setchecker
+import snapshot
+from setchecker import (
+    CARD_COLUMNS,
+    LIST_FIELDS,
+    CalculateDropChance,
+    _build_cardset,
+    count_sets,
+    fetch_copies,
+    fetch_deck_copies,
+    get_connection_pool,
+    invalidate_set_totals,
+    my_logger,
+    resolve_booster_data,
+    use_snapshot,
+)
+from filters import Has
+from importer import write_meta
+from migrate import refresh_views
+from schemas import CardSet, _camel_case
+from setcover import recommend_sets
+
+RARITIES = ["common", "uncommon", "rare", "mythic"]
+RARITY_SHARES = [0.45, 0.3, 0.2, 0.05]
+TYPES = ["Creature", "Instant", "Sorcery", "Artifact", "Enchantment", "Land"]
+TYPE_SHARES = [0.45, 0.15, 0.12, 0.1, 0.1, 0.08]
+
+# booster name -> list of (booster weight, {sheet name: picks})
+BOOSTERS = {
+    "draft": [
+        (3, {"common": 10, "uncommon": 3, "rareMythic": 1}),
+        (1, {"common": 9, "uncommon": 3, "rareMythic": 1, "foil": 1}),
+    ],
+    "collector": [
+        (1, {"foil": 5, "uncommon": 4, "rareMythic": 2}),
+    ],
+}
+
+# sheet name -> rarity -> card weight on the sheet
+SHEETS = {
+    "common": {"common": 1},
+    "uncommon": {"uncommon": 1},
+    "rareMythic": {"rare": 2, "mythic": 1},
+    "foil": {"common": 10, "uncommon": 3, "rare": 2, "mythic": 1},
+}
+
+
+def generate_dataset(printings: int = 30_000, sets: int = 300, seed: int = 0) -> Dict:
+    """
+    Generates MTGJSON shaped rows with realistic cardinalities. Card names are drawn with a Zipf like
+    popularity, so a few staples are reprinted in many sets like Sol Ring or basic lands.
+    Returns the rows per table in the column order snapshot.write_snapshot expects.
+    """
+    rng = np.random.default_rng(seed)
+    names = [f"Synthetic Card {i}" for i in range(max(printings // 2, 1))]
+    popularity = 1 / np.arange(1, len(names) + 1) ** 0.8
+    popularity /= popularity.sum()
+    card_rarity = rng.choice(RARITIES, size=len(names), p=RARITY_SHARES)
+    card_type = rng.choice(TYPES, size=len(names), p=TYPE_SHARES)
+
+    card_rows, sheet_rows, content_rows, weight_rows, booster_sheet_rows = [], [], [], [], []
+    per_set = max(printings // sets, 1)
+
+    for set_number in range(sets):
+        set_code = f"S{set_number:03d}"
+        picks = rng.choice(len(names), size=min(per_set, len(names)), replace=False, p=popularity)
+        set_cards = []
+        for number, card in enumerate(picks):
+            uuid = f"{set_code}-{number:04d}"
+            rarity = str(card_rarity[card])
+            card_types = str(card_type[card])
+            values = {
+                "availability": "paper,mtgo" if rng.random() < 0.7 else "paper",
+                "border_color": "black",
+                "color_identity": "G",
+                "colors": "G",
+                "finishes": "nonfoil,foil",
+                "frame_version": "2015",
+                "language": "English",
+                "layout": "normal",
+                "mana_value": float(rng.integers(0, 8)),
+                "name": names[card],
+                "number": str(number + 1),
+                "rarity": rarity,
+                "set_code": set_code,
+                "subtypes": "",
+                "supertypes": "Basic" if card_types == "Land" else "",
+                "type": card_types,
+                "types": card_types,
+                "uuid": uuid,
+            }
+            card_rows.append(tuple(values[field] for field in CARD_COLUMNS))
+            set_cards.append((uuid, rarity))
+
+        booster_names = ["draft", "collector"] if set_number % 3 == 0 else ["draft"]
+        for booster_name in booster_names:
+            sheet_names = set()
+            for booster_index, (booster_weight, contents) in enumerate(BOOSTERS[booster_name]):
+                weight_rows.append((booster_name, booster_index, booster_weight, set_code))
+                for sheet_name, sheet_picks in contents.items():
+                    content_rows.append(
+                        (booster_name, booster_index, set_code, sheet_name, sheet_picks)
+                    )
+                    sheet_names.add(sheet_name)
+            for sheet_name in sorted(sheet_names):
+                booster_sheet_rows.append((booster_name, set_code, sheet_name == "foil", sheet_name))
+                for uuid, rarity in set_cards:
+                    card_weight = SHEETS[sheet_name].get(rarity)
+                    if card_weight:
+                        sheet_rows.append((booster_name, uuid, card_weight, set_code, sheet_name))
+
+    return {
+        "Names": names,
+        "Popularity": popularity,
+        "cards": card_rows,
+        "setboostersheetcards": sheet_rows,
+        "setboostercontents": content_rows,
+        "setboostercontentweights": weight_rows,
+        "setboostersheets": booster_sheet_rows,
+    }
+
+
+def generate_decks(dataset: Dict, sizes: List[int], seed: int = 0) -> Dict[int, List]:
+    """
+    Draws synthetic decks of the given numbers of distinct cards, weighted by card popularity.
+    """
+    rng = np.random.default_rng(seed)
+    names = dataset["Names"]
+    decks = {}
+    for size in sizes:
+        picks = rng.choice(
+            len(names), size=min(size, len(names)), replace=False, p=dataset["Popularity"]
+        )
+        decks[size] = [(int(rng.integers(1, 5)), names[card]) for card in picks]
+    return decks
+
+
+def write_snapshot(dataset: Dict, path: str):
+    snapshot.write_snapshot(
+        path,
+        list(CARD_COLUMNS.values()),
+        dataset["cards"],
+        dataset["setboostersheetcards"],
+        dataset["setboostercontents"],
+        dataset["setboostercontentweights"],
+        version="synthetic",
+        booster_sheet_rows=dataset["setboostersheets"],
+    )
+
+
+def load_postgres(dataset: Dict, replace: bool = False):
+    """
+    Loads the dataset into the database configured for setchecker with COPY.
+    Refuses to touch existing tables unless replace is set, only point this at a scratch database.
+    """
+    tables = {
+        "cards": list(CARD_COLUMNS.values()),
+        "setboostersheetcards": snapshot.SHEET_CARD_COLUMNS,
+        "setboostercontents": snapshot.BOOSTER_CONTENT_COLUMNS,
+        "setboostercontentweights": snapshot.BOOSTER_WEIGHT_COLUMNS,
+        "setboostersheets": snapshot.BOOSTER_SHEET_COLUMNS,
+    }
+    column_types = {
+        "manavalue": "real",
+        "cardweight": "integer",
+        "boosterindex": "integer",
+        "boosterweight": "integer",
+        "sheetpicks": "integer",
+        "sheetisfoil": "boolean",
+    }
+
+    connections = get_connection_pool()
+    conn = connections.getconn()
+    try:
+        with conn.cursor() as cursor:
+            for table, columns in tables.items():
+                cursor.execute("SELECT to_regclass(%s)", [table])
+                if cursor.fetchone()[0] is not None:
+                    if not replace:
+                        raise RuntimeError(
+                            f"Table {table} already exists, pass --replace to overwrite it."
+                        )
+                    # Truncate rather than drop, the set totals views of migrate.py depend on the tables.
+                    cursor.execute(f"TRUNCATE {table}")
+                else:
+                    # setboostersheetcards.* is read positionally, so it keeps a leading id column.
+                    definitions = [
+                        f"{column} {column_types.get(column, 'text')}" for column in columns
+                    ]
+                    if table == "setboostersheetcards":
+                        definitions.insert(0, "id serial")
+                    cursor.execute(f"CREATE TABLE {table} ({', '.join(definitions)})")
+
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(dataset[table])
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+                )
+            write_meta(cursor, None, "benchmark")
+        conn.commit()
+    finally:
+        connections.putconn(conn)
+
+    refresh_views()
+
+
+@contextlib.contextmanager
+def count_queries(counter: Dict):
+    """
+    Counts the database queries, or snapshot lookups, issued inside the block.
+    """
+    patched = [(setchecker, "_fetch_query")]
+    if setchecker.snapshot is not None:
+        patched += [
+            (setchecker.snapshot, method)
+            for method in [
+                "card_rows",
+                "booster_rows",
+                "sheet_rows",
+                "booster_total_rows",
+                "sheet_total_rows",
+            ]
+        ]
+
+    originals = [(target, name, getattr(target, name)) for target, name in patched]
+
+    def counting(function: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            counter["Queries"] += 1
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    for target, name, function in originals:
+        setattr(target, name, counting(function))
+    try:
+        yield counter
+    finally:
+        for target, name, function in originals:
+            if target is setchecker.snapshot:
+                delattr(target, name)
+            else:
+                setattr(target, name, function)
+
+
+def measure(stage: str, function: Callable, repeat: int) -> Dict:
+    """
+    Runs a stage repeat times with cold set totals caches for its timings, then once more under
+    tracemalloc for its query count and peak memory.
+    """
+    timings = []
+    for _ in range(repeat):
+        invalidate_set_totals()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    invalidate_set_totals()
+    counter = {"Queries": 0}
+    tracemalloc.start()
+    with count_queries(counter):
+        function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "Stage": stage,
+        "MinSeconds": min(timings),
+        "MedianSeconds": statistics.median(timings),
+        "Queries": counter["Queries"],
+        "PeakBytes": peak,
+    }
+
+
+def run_deck(deck_size: int, deck_data: List, deck_file: str, repeat: int) -> List[Dict]:
+    card_names = [card_name for _, card_name in deck_data]
+
+    def fetch():
+        return fetch_deck_copies(card_names)
+
+    def fetch_and_resolve():
+        copies = fetch_deck_copies(card_names)
+        cards = [card for card_copies in copies.values() for card in card_copies]
+        resolve_booster_data(cards)
+        return cards
+
+    def per_card():
+        for card_name in card_names:
+            for card in fetch_copies(card_name):
+                len(card.boosters)
+
+    def set_counts():
+        counts = {}
+        copies = fetch_deck_copies(card_names, card_filter=~Has("types", "Land"))
+        for _, card_name in deck_data:
+            count_sets(copies[card_name], counts)
+        return counts
+
+    cards = fetch_and_resolve()
+    counts = set_counts()
+
+    def run_main():
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            setchecker.main(deck_file)
+
+    stages = [
+        ("fetch_deck_copies", fetch),
+        ("fetch_deck_copies+boosters", fetch_and_resolve),
+        ("fetch_copies_per_card", per_card),
+        ("CalculateDropChance", lambda: CalculateDropChance(cards)),
+        ("recommend_sets", lambda: recommend_sets(counts, deck_data)),
+        ("main", run_main),
+    ]
+
+    results = []
+    for stage, function in stages:
+        result = measure(stage, function, repeat)
+        result.update({"DeckSize": deck_size, "Printings": len(cards)})
+        results.append(result)
+        my_logger.info(
+            f"{stage} ({deck_size} cards): {result['MedianSeconds'] * 1000:.1f} ms, "
+            f"{result['Queries']} queries, {result['PeakBytes'] / 1024:.0f} KiB peak"
+        )
+    return results
+
+
+def run_decode(dataset: Dict, repeat: int) -> List[Dict]:
+    """
+    Measures building a CardSet for every printing, from the card rows as setchecker fetches them and from
+    MTGJSON shaped card objects. The peak memory includes holding all the CardSets at once.
+    """
+    fields = list(CARD_COLUMNS)
+    rows = [dict(zip(fields, row)) for row in dataset["cards"]]
+    json_cards = [
+        {
+            _camel_case(field): (value.split(",") if value else []) if field in LIST_FIELDS else value
+            for field, value in row.items()
+        }
+        for row in rows
+    ]
+
+    stages = [
+        ("decode_rows", lambda: [_build_cardset(row, {}, {}) for row in rows]),
+        ("decode_json", lambda: [CardSet.from_json(card) for card in json_cards]),
+    ]
+
+    results = []
+    for stage, function in stages:
+        result = measure(stage, function, repeat)
+        result.update(
+            {
+                "DeckSize": None,
+                "Printings": len(rows),
+                "PerSecond": len(rows) / result["MedianSeconds"],
+            }
+        )
+        results.append(result)
+        my_logger.info(
+            f"{stage}: {result['PerSecond']:.0f} printings/s, {result['PeakBytes'] / 1024:.0f} KiB peak"
+        )
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    target: str = "snapshot",
+    printings: int = 30_000,
+    sets: int = 300,
+    deck_sizes=(60, 100, 250),
+    repeat: int = 3,
+    seed: int = 0,
+    replace: bool = False,
+) -> Dict:
+    dataset = generate_dataset(printings=printings, sets=sets, seed=seed)
+    decks = generate_decks(dataset, list(deck_sizes), seed=seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        if target == "snapshot":
+            write_snapshot(dataset, os.path.join(directory, "snapshot"))
+            use_snapshot(os.path.join(directory, "snapshot"))
+        else:
+            load_postgres(dataset, replace=replace)
+            use_snapshot(None)
+
+        results = run_decode(dataset, repeat)
+        for deck_size, deck_data in decks.items():
+            deck_file = os.path.join(directory, f"deck_{deck_size}.txt")
+            with open(deck_file, "w") as f:
+                f.writelines(f"{count} {card_name}\n" for count, card_name in deck_data)
+            results.extend(run_deck(deck_size, deck_data, deck_file, repeat))
+
+        use_snapshot(None)
+
+    return {
+        "Commit": _git_commit(),
+        "Python": platform.python_version(),
+        "NumPy": np.__version__,
+        "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "Target": target,
+        "Dataset": {
+            "Printings": len(dataset["cards"]),
+            "SheetCards": len(dataset["setboostersheetcards"]),
+            "Sets": sets,
+            "Seed": seed,
+        },
+        "Results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks setchecker against a synthetic MTGJSON dataset.")
+    parser.add_argument(
+        "--target",
+        choices=["snapshot", "postgres"],
+        default="snapshot",
+        help="load the dataset into a temporary snapshot, or into the configured (scratch) database",
+    )
+    parser.add_argument("--printings", type=int, default=30_000)
+    parser.add_argument("--sets", type=int, default=300)
+    parser.add_argument("--deck-sizes", type=int, nargs="+", default=[60, 100, 250])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replace", action="store_true", help="replace the rows of existing tables in the database")
+    parser.add_argument("--output", help="JSON file to write the results to, defaults to stdout")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        target=args.target,
+        printings=args.printings,
+        sets=args.sets,
+        deck_sizes=args.deck_sizes,
+        repeat=args.repeat,
+        seed=args.seed,
+        replace=args.replace,
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
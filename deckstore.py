@@ -0,0 +1,112 @@
+import json
+import os
+import sqlite3
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_STORE_PATH = ".setchecker.sqlite"
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class DeckStore:
+    """
+    Persists the last analyzed version of every deck: its read_deck output and the printing rows of each of its
+    cards, keyed by deck path, card name and the dataset version the rows were fetched from.
+    A rerun only has to fetch the cards that were added since, see setchecker.fetch_deck_copies_incremental.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS decks (
+                path TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                deck TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS deck_cards (
+                path TEXT NOT NULL,
+                version TEXT NOT NULL,
+                card_name TEXT NOT NULL,
+                printings TEXT NOT NULL,
+                PRIMARY KEY (path, version, card_name)
+            );
+            """
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    @staticmethod
+    def _key(deck_path: str) -> str:
+        return os.path.abspath(deck_path)
+
+    def load(
+        self, deck_path: str, version: str
+    ) -> Tuple[Optional[List[Tuple[int, str]]], Dict[str, List[Dict]]]:
+        """
+        Returns the stored deck data and the printing rows per card name of deck_path for the dataset version.
+        Returns (None, {}) when the deck was never stored or was stored for another version.
+        """
+        path = self._key(deck_path)
+
+        deck = self.conn.execute(
+            "SELECT deck FROM decks WHERE path = ? AND version = ?", (path, version)
+        ).fetchone()
+        if deck is None:
+            return None, {}
+
+        rows = self.conn.execute(
+            "SELECT card_name, printings FROM deck_cards WHERE path = ? AND version = ?",
+            (path, version),
+        )
+        return (
+            [tuple(line) for line in json.loads(deck[0])],
+            {card_name: json.loads(printings) for card_name, printings in rows},
+        )
+
+    def save(
+        self,
+        deck_path: str,
+        version: str,
+        deck_data: List[Tuple[int, str]],
+        added: Dict[str, List[Dict]],
+        removed: List[str],
+    ):
+        """
+        Stores the new deck data of deck_path, adds the printing rows of the added cards and drops the removed ones.
+        Rows stored for other dataset versions are dropped as well.
+        """
+        path = self._key(deck_path)
+
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM deck_cards WHERE path = ? AND version != ?", (path, version)
+            )
+            self.conn.executemany(
+                "DELETE FROM deck_cards WHERE path = ? AND version = ? AND card_name = ?",
+                [(path, version, card_name) for card_name in removed],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO deck_cards (path, version, card_name, printings) VALUES (?, ?, ?, ?)",
+                [
+                    (path, version, card_name, json.dumps(printings, default=_json_default))
+                    for card_name, printings in added.items()
+                ],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO decks (path, version, deck) VALUES (?, ?, ?)",
+                (path, version, json.dumps(deck_data)),
+            )
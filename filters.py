@@ -0,0 +1,184 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# CardSet fields holding lists, comma separated text in the cards table.
+LIST_FILTER_FIELDS = {
+    "availability",
+    "color_identity",
+    "colors",
+    "finishes",
+    "subtypes",
+    "supertypes",
+    "types",
+}
+
+SCALAR_FILTER_FIELDS = {
+    "border_color",
+    "frame_version",
+    "language",
+    "layout",
+    "rarity",
+    "set_code",
+}
+
+
+class CardFilter:
+    """
+    A predicate over printings that compiles to a WHERE clause of the cards query, so excluded printings are
+    never fetched, and evaluates in memory on CardSets or card rows for the snapshot path.
+    Filters combine with & (and), | (or) and ~ (not). NULL columns never match a leaf filter, in both forms.
+    """
+
+    def sql(self, columns: Dict[str, str]) -> Tuple[str, List]:
+        """
+        Returns the condition and its parameters, columns maps CardSet fields to cards columns.
+        """
+        raise NotImplementedError
+
+    def matches(self, card) -> bool:
+        raise NotImplementedError
+
+    def __and__(self, other: "CardFilter") -> "CardFilter":
+        return AllOf(self, other)
+
+    def __or__(self, other: "CardFilter") -> "CardFilter":
+        return AnyOf(self, other)
+
+    def __invert__(self) -> "CardFilter":
+        return Not(self)
+
+
+def _field_value(card, field: str):
+    return card.get(field) if isinstance(card, dict) else getattr(card, field)
+
+
+class Has(CardFilter):
+    """
+    Matches printings whose list field holds any of values, like Has("availability", "paper").
+    """
+
+    def __init__(self, field: str, *values: str):
+        if field not in LIST_FILTER_FIELDS:
+            raise ValueError(f"{field} is not a list field, use Is.")
+        self.field = field
+        self.values = set(values)
+
+    def sql(self, columns: Dict[str, str]) -> Tuple[str, List]:
+        return (
+            f"COALESCE(string_to_array({columns[self.field]}, ',') && %s::text[], false)",
+            [sorted(self.values)],
+        )
+
+    def matches(self, card) -> bool:
+        value = _field_value(card, self.field)
+        if not value:
+            return False
+        if isinstance(value, str):
+            value = value.split(",")
+        return not self.values.isdisjoint(value)
+
+    def __repr__(self) -> str:
+        return f"Has({self.field!r}, {', '.join(map(repr, sorted(self.values)))})"
+
+
+class Is(CardFilter):
+    """
+    Matches printings whose field equals one of values, like Is("language", "English").
+    """
+
+    def __init__(self, field: str, *values: str):
+        if field not in SCALAR_FILTER_FIELDS:
+            raise ValueError(f"{field} can not be compared as a whole, use Has.")
+        self.field = field
+        self.values = set(values)
+
+    def sql(self, columns: Dict[str, str]) -> Tuple[str, List]:
+        return f"COALESCE({columns[self.field]} = ANY(%s), false)", [sorted(self.values)]
+
+    def matches(self, card) -> bool:
+        return _field_value(card, self.field) in self.values
+
+    def __repr__(self) -> str:
+        return f"Is({self.field!r}, {', '.join(map(repr, sorted(self.values)))})"
+
+
+class AllOf(CardFilter):
+    def __init__(self, *filters: CardFilter):
+        self.filters = filters
+
+    def sql(self, columns: Dict[str, str]) -> Tuple[str, List]:
+        if not self.filters:
+            return "true", []
+        clauses = [card_filter.sql(columns) for card_filter in self.filters]
+        return (
+            "(" + " AND ".join(clause for clause, _ in clauses) + ")",
+            [parameter for _, parameters in clauses for parameter in parameters],
+        )
+
+    def matches(self, card) -> bool:
+        return all(card_filter.matches(card) for card_filter in self.filters)
+
+    def __repr__(self) -> str:
+        return " & ".join(map(repr, self.filters)) or "AllOf()"
+
+
+class AnyOf(CardFilter):
+    def __init__(self, *filters: CardFilter):
+        self.filters = filters
+
+    def sql(self, columns: Dict[str, str]) -> Tuple[str, List]:
+        if not self.filters:
+            return "false", []
+        clauses = [card_filter.sql(columns) for card_filter in self.filters]
+        return (
+            "(" + " OR ".join(clause for clause, _ in clauses) + ")",
+            [parameter for _, parameters in clauses for parameter in parameters],
+        )
+
+    def matches(self, card) -> bool:
+        return any(card_filter.matches(card) for card_filter in self.filters)
+
+    def __repr__(self) -> str:
+        return "(" + " | ".join(map(repr, self.filters)) + ")"
+
+
+class Not(CardFilter):
+    def __init__(self, card_filter: CardFilter):
+        self.filter = card_filter
+
+    def sql(self, columns: Dict[str, str]) -> Tuple[str, List]:
+        clause, parameters = self.filter.sql(columns)
+        return f"NOT {clause}", parameters
+
+    def matches(self, card) -> bool:
+        return not self.filter.matches(card)
+
+    def __repr__(self) -> str:
+        return f"~{self.filter!r}"
+
+
+def parse_filter(spec: str) -> CardFilter:
+    """
+    Parses "field=value[,value...]" (keep printings matching any value) or "field!=value[,value...]"
+    (drop them), like "language=English", "availability=paper" or "types!=Land".
+    """
+    negate = "!=" in spec
+    field, separator, values = spec.partition("!=" if negate else "=")
+    field = field.strip().replace("-", "_")
+    values = [value.strip() for value in values.split(",") if value.strip()]
+    if not separator or not values:
+        raise ValueError(f"Filter {spec!r} is not of the form field=value or field!=value.")
+    if field not in LIST_FILTER_FIELDS and field not in SCALAR_FILTER_FIELDS:
+        raise ValueError(
+            f"Unknown filter field {field!r}, use one of "
+            f"{', '.join(sorted(LIST_FILTER_FIELDS | SCALAR_FILTER_FIELDS))}."
+        )
+
+    card_filter = Has(field, *values) if field in LIST_FILTER_FIELDS else Is(field, *values)
+    return ~card_filter if negate else card_filter
+
+
+def parse_filters(specs: Iterable[str]) -> Optional[CardFilter]:
+    filters = [parse_filter(spec) for spec in specs]
+    if not filters:
+        return None
+    return filters[0] if len(filters) == 1 else AllOf(*filters)
@@ -0,0 +1,253 @@
+import argparse
+import csv
+import io
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import ijson
+
+import snapshot
+from migrate import migrate, refresh_views
+from schemas import BoosterPack, CardSet, SheetCard
+from setchecker import (
+    CARD_COLUMNS,
+    LIST_FIELDS,
+    OPTIONAL_CARD_COLUMNS,
+    get_connection_pool,
+    my_logger,
+)
+
+# Rows buffered per table before they are sent with COPY, bounds the memory of an import.
+BATCH_ROWS = 50_000
+
+IMPORT_CARD_COLUMNS = {**CARD_COLUMNS, **OPTIONAL_CARD_COLUMNS}
+
+TABLE_COLUMNS = {
+    "cards": list(IMPORT_CARD_COLUMNS.values()),
+    "setboostersheetcards": snapshot.SHEET_CARD_COLUMNS,
+    "setboostercontents": snapshot.BOOSTER_CONTENT_COLUMNS,
+    "setboostercontentweights": snapshot.BOOSTER_WEIGHT_COLUMNS,
+    "setboostersheets": snapshot.BOOSTER_SHEET_COLUMNS,
+}
+
+COLUMN_TYPES = {
+    "manavalue": "real",
+    "edhrecrank": "integer",
+    "isonlineonly": "boolean",
+    "ispromo": "boolean",
+    "isreprint": "boolean",
+    "cardweight": "integer",
+    "boosterindex": "integer",
+    "boosterweight": "integer",
+    "sheetpicks": "integer",
+    "sheetisfoil": "boolean",
+}
+
+
+def boosters_from_json(set_code: str, booster: Dict) -> Tuple[List[BoosterPack], List[SheetCard]]:
+    """
+    Maps the booster object of an MTGJSON set onto a BoosterPack per booster variant and sheet and a SheetCard
+    per card on a sheet. The booster index is the position of the variant in its booster's list.
+    """
+    booster_packs = []
+    sheet_cards = []
+    for booster_name, booster_data in (booster or {}).items():
+        for booster_index, variant in enumerate(booster_data.get("boosters", [])):
+            for sheet_name, sheet_picks in variant.get("contents", {}).items():
+                booster_packs.append(
+                    BoosterPack(
+                        set_code=set_code,
+                        booster_name=booster_name,
+                        booster_index=booster_index,
+                        booster_weight=variant.get("weight"),
+                        sheet_name=sheet_name,
+                        sheet_picks=sheet_picks,
+                    )
+                )
+        for sheet_name, sheet in booster_data.get("sheets", {}).items():
+            for card_uuid, card_weight in sheet.get("cards", {}).items():
+                sheet_cards.append(
+                    SheetCard(
+                        set_code=set_code,
+                        booster_name=booster_name,
+                        card_uuid=card_uuid,
+                        card_weight=card_weight,
+                        sheet_name=sheet_name,
+                        sheet_weight=sheet.get("totalWeight"),
+                    )
+                )
+    return booster_packs, sheet_cards
+
+
+def _card_row(card: CardSet) -> List:
+    row = []
+    for field in IMPORT_CARD_COLUMNS:
+        value = getattr(card, field)
+        if field in LIST_FIELDS:
+            value = ",".join(value) if value else None
+        row.append(value)
+    return row
+
+
+def set_rows(set_code: str, set_data: Dict) -> Iterator[Tuple[str, List]]:
+    """
+    Yields (table, row) for every row of the tables setchecker reads that one MTGJSON set contributes.
+    """
+    for card in set_data.get("cards", []):
+        yield "cards", _card_row(CardSet.from_json(card))
+
+    booster_packs, sheet_cards = boosters_from_json(set_code, set_data.get("booster"))
+    weights = {}
+    for booster_pack in booster_packs:
+        yield "setboostercontents", [
+            booster_pack.booster_name,
+            booster_pack.booster_index,
+            booster_pack.set_code,
+            booster_pack.sheet_name,
+            booster_pack.sheet_picks,
+        ]
+        weights[(booster_pack.booster_name, booster_pack.booster_index)] = booster_pack.booster_weight
+    for (booster_name, booster_index), booster_weight in weights.items():
+        yield "setboostercontentweights", [booster_name, booster_index, booster_weight, set_code]
+    for booster_name, booster_data in (set_data.get("booster") or {}).items():
+        for sheet_name, sheet in booster_data.get("sheets", {}).items():
+            yield "setboostersheets", [booster_name, set_code, sheet.get("foil"), sheet_name]
+    for sheet_card in sheet_cards:
+        yield "setboostersheetcards", [
+            sheet_card.booster_name,
+            sheet_card.card_uuid,
+            sheet_card.card_weight,
+            sheet_card.set_code,
+            sheet_card.sheet_name,
+        ]
+
+
+class _CopyBuffer:
+    """
+    Buffers the rows of a table as CSV and sends them with COPY once BATCH_ROWS are buffered.
+    """
+
+    def __init__(self, cursor, table: str, columns: List[str]):
+        self.cursor = cursor
+        self.table = table
+        self.columns = columns
+        self.rows = 0
+        self.total = 0
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def add(self, row: List):
+        self._writer.writerow(row)
+        self.rows += 1
+        if self.rows >= BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        self._buffer.seek(0)
+        self.cursor.copy_expert(
+            f"COPY {self.table} ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)",
+            self._buffer,
+        )
+        self.total += self.rows
+        self.rows = 0
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+
+def _prepare_tables(cursor, replace: bool):
+    for table, columns in TABLE_COLUMNS.items():
+        cursor.execute("SELECT to_regclass(%s)", [table])
+        if cursor.fetchone()[0] is None:
+            # setboostersheetcards.* is read positionally, so it keeps a leading id column.
+            definitions = [f"{column} {COLUMN_TYPES.get(column, 'text')}" for column in columns]
+            if table == "setboostersheetcards":
+                definitions.insert(0, "id serial")
+            cursor.execute(f"CREATE TABLE {table} ({', '.join(definitions)})")
+        elif replace:
+            cursor.execute(f"TRUNCATE {table}")
+        else:
+            raise RuntimeError(f"Table {table} already exists, pass --replace to reload it.")
+
+
+def write_meta(cursor, date: Optional[str], version: Optional[str]):
+    """
+    Replaces the meta row with the dataset's date and version and the time of the load. Every load gets a new
+    loaded_at, so setchecker.dataset_version changes whenever the tables are reloaded.
+    """
+    cursor.execute("CREATE TABLE IF NOT EXISTS meta (date text, version text)")
+    cursor.execute("ALTER TABLE meta ADD COLUMN IF NOT EXISTS loaded_at timestamptz")
+    cursor.execute("DELETE FROM meta")
+    cursor.execute(
+        "INSERT INTO meta (date, version, loaded_at) VALUES (%s, %s, clock_timestamp())",
+        [date, version],
+    )
+
+
+def import_all_printings(path: str, replace: bool = False) -> Dict[str, int]:
+    """
+    Streams an MTGJSON AllPrintings.json file into the cards and booster tables, one set at a time, so memory
+    stays bounded by the largest set plus one COPY batch per table. The load runs in one transaction.
+    Applies the migrations and refreshes the set totals views afterwards. Returns the rows loaded per table.
+    """
+    with open(path, "rb") as f:
+        meta = next(ijson.items(f, "meta"), {})
+
+    connections = get_connection_pool()
+    conn = connections.getconn()
+    start = time.perf_counter()
+
+    try:
+        with conn, conn.cursor() as cursor:
+            _prepare_tables(cursor, replace)
+            write_meta(cursor, meta.get("date"), meta.get("version"))
+
+            buffers = {
+                table: _CopyBuffer(cursor, table, columns)
+                for table, columns in TABLE_COLUMNS.items()
+            }
+            with open(path, "rb") as f:
+                for set_number, (set_code, set_data) in enumerate(
+                    ijson.kvitems(f, "data", use_float=True), start=1
+                ):
+                    for table, row in set_rows(set_code, set_data):
+                        buffers[table].add(row)
+
+                    if set_number % 100 == 0:
+                        rows = sum(buffer.total + buffer.rows for buffer in buffers.values())
+                        elapsed = time.perf_counter() - start
+                        my_logger.info(
+                            f"{set_number} sets, {rows} rows, {rows / elapsed:.0f} rows/s"
+                        )
+
+            for buffer in buffers.values():
+                buffer.flush()
+    finally:
+        connections.putconn(conn)
+
+    counts = {table: buffer.total for table, buffer in buffers.items()}
+    rows = sum(counts.values())
+    elapsed = time.perf_counter() - start
+    my_logger.info(
+        f"Imported {rows} rows in {elapsed:.1f} s ({rows / elapsed:.0f} rows/s): {counts}"
+    )
+
+    migrate()
+    refresh_views()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Loads an MTGJSON AllPrintings.json file into the database setchecker reads."
+    )
+    parser.add_argument("path", help="AllPrintings.json file")
+    parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="replace the rows of existing tables instead of refusing to load",
+    )
+    args = parser.parse_args()
+
+    import_all_printings(args.path, replace=args.replace)
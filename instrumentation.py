@@ -0,0 +1,297 @@
+import bisect
+import contextlib
+import cProfile
+import io
+import pstats
+import re
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+# Upper bounds of the latency and pool wait histogram buckets, in seconds.
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# Upper bounds of the returned rows histogram buckets.
+ROW_BUCKETS = [0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+@dataclass
+class QueryEvent:
+    fingerprint: str
+    seconds: float
+    pool_wait_seconds: float
+    rows: int
+    error: Optional[str] = None
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?\s*,\s*)+\?\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(query: str) -> str:
+    """
+    Normalizes a query so that runs with different parameters group together: literals and placeholders
+    become ?, lists of them collapse to (?) and whitespace and case are normalized.
+    """
+    normalized = _STRING_LITERAL.sub("?", query)
+    normalized = normalized.replace("%s", "?")
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _PLACEHOLDER_LIST.sub("(?)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip().lower()
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed bucket bounds, in the shape Prometheus expects.
+    """
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the q-th quantile, None when empty.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + [float("inf")], self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class QueryStats:
+    """
+    Aggregates QueryEvents per query fingerprint into latency, pool wait and row count histograms.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries: Dict[str, Dict] = {}
+
+    def __call__(self, event: QueryEvent):
+        with self._lock:
+            stats = self.queries.get(event.fingerprint)
+            if stats is None:
+                stats = self.queries[event.fingerprint] = {
+                    "Latency": Histogram(LATENCY_BUCKETS),
+                    "PoolWait": Histogram(LATENCY_BUCKETS),
+                    "Rows": Histogram(ROW_BUCKETS),
+                    "Errors": Counter(),
+                }
+            stats["Latency"].observe(event.seconds)
+            stats["PoolWait"].observe(event.pool_wait_seconds)
+            stats["Rows"].observe(event.rows)
+            if event.error:
+                stats["Errors"][event.error] += 1
+
+    def reset(self):
+        with self._lock:
+            self.queries.clear()
+
+    def summary(self) -> List[Dict]:
+        """
+        One Dict per fingerprint, slowest total time first.
+        """
+        with self._lock:
+            summary = [
+                {
+                    "Query": query,
+                    "Count": stats["Latency"].count,
+                    "TotalSeconds": stats["Latency"].total,
+                    "P50Seconds": stats["Latency"].quantile(0.5),
+                    "P99Seconds": stats["Latency"].quantile(0.99),
+                    "PoolWaitSeconds": stats["PoolWait"].total,
+                    "Rows": int(stats["Rows"].total),
+                    "Errors": dict(stats["Errors"]),
+                }
+                for query, stats in self.queries.items()
+            ]
+        return sorted(summary, key=lambda entry: -entry["TotalSeconds"])
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, key, help_text in [
+                ("setchecker_query_seconds", "Latency", "Query execution time."),
+                ("setchecker_query_pool_wait_seconds", "PoolWait", "Time spent getting a pooled connection."),
+                ("setchecker_query_rows", "Rows", "Rows returned per query."),
+            ]:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for query, stats in self.queries.items():
+                    histogram = stats[key]
+                    label = query.replace("\\", "\\\\").replace('"', '\\"')
+                    cumulative = 0
+                    for bound, count in zip(histogram.bounds + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(
+                            f'{name}_bucket{{query="{label}",le="{bound}"}} {cumulative}'
+                        )
+                    lines.append(f'{name}_sum{{query="{label}"}} {histogram.total}')
+                    lines.append(f'{name}_count{{query="{label}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+# Callbacks receiving a QueryEvent for every query that runs through setchecker._fetch_query.
+instruments: List[Callable[[QueryEvent], None]] = []
+
+query_stats = QueryStats()
+instruments.append(query_stats)
+
+
+def add_instrument(instrument: Callable[[QueryEvent], None]):
+    instruments.append(instrument)
+
+
+def remove_instrument(instrument: Callable[[QueryEvent], None]):
+    instruments.remove(instrument)
+
+
+def record_query(
+    query: str, seconds: float, pool_wait_seconds: float, rows: int, error: Optional[str] = None
+):
+    if not instruments:
+        return
+
+    event = QueryEvent(fingerprint(query), seconds, pool_wait_seconds, rows, error)
+    for instrument in instruments:
+        instrument(event)
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serves query_stats in the Prometheus text format on /metrics from a daemon thread.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = query_stats.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of a thread every interval seconds from a background thread and counts the
+    sampled functions, cheap enough to leave on for a production run.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = Counter()
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.total += 1
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                key = f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+                # Count a function once per sample, even when it recurses.
+                if key not in seen:
+                    self.samples[key] += 1
+                    seen.add(key)
+                frame = frame.f_back
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def report(self, limit: int = 30) -> str:
+        lines = [f"{self.total} samples every {self.interval * 1000:.1f} ms"]
+        for key, count in self.samples.most_common(limit):
+            lines.append(f"{count / max(self.total, 1):7.1%}  {key}")
+        return "\n".join(lines) + "\n"
+
+
+@contextlib.contextmanager
+def profiled(mode: Optional[str], output: Optional[str] = None):
+    """
+    Profiles the block with cProfile (mode "cprofile") or the SamplingProfiler (mode "sample").
+    The report is written to output, or to stderr when no output is given. Does nothing for mode None.
+    """
+    if not mode:
+        yield
+        return
+
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+            else:
+                stream = io.StringIO()
+                pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(30)
+                sys.stderr.write(stream.getvalue())
+    elif mode == "sample":
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            if output:
+                with open(output, "w") as f:
+                    f.write(profiler.report())
+            else:
+                sys.stderr.write(profiler.report())
+    else:
+        raise ValueError(f"Unknown profile mode {mode}, use cprofile or sample.")
+
+
+def format_summary(summary: List[Dict]) -> str:
+    lines = []
+    for entry in summary:
+        lines.append(
+            f"{entry['Count']:6d}x {entry['TotalSeconds'] * 1000:9.1f} ms total, "
+            f"p50 <= {entry['P50Seconds'] * 1000:.1f} ms, p99 <= {entry['P99Seconds'] * 1000:.1f} ms, "
+            f"pool wait {entry['PoolWaitSeconds'] * 1000:.1f} ms, {entry['Rows']} rows"
+            + (f", errors {entry['Errors']}" if entry["Errors"] else "")
+            + f"\n        {entry['Query'][:160]}"
+        )
+    return "\n".join(lines)
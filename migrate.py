@@ -0,0 +1,98 @@
+import argparse
+import glob
+import os
+from typing import List
+
+from setchecker import get_connection_pool, invalidate_set_totals, my_logger
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Materialized views created by the migrations, refreshed after every data load.
+MATERIALIZED_VIEWS = ["set_booster_totals", "set_sheet_totals"]
+
+
+def _migration_files() -> List[str]:
+    return sorted(glob.glob(os.path.join(MIGRATIONS_DIR, "*.sql")))
+
+
+def migrate() -> List[str]:
+    """
+    Applies the migrations/*.sql files that were not applied yet, in file name order, each in its own
+    transaction, and records them in schema_migrations. Returns the names of the applied migrations.
+    Expects the MTGJSON tables to be loaded already.
+    """
+    connections = get_connection_pool()
+    conn = connections.getconn()
+    applied = []
+
+    try:
+        with conn, conn.cursor() as cursor:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    name TEXT PRIMARY KEY,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                """
+            )
+            cursor.execute("SELECT name FROM schema_migrations")
+            done = {row[0] for row in cursor.fetchall()}
+
+        for path in _migration_files():
+            name = os.path.basename(path)
+            if name in done:
+                continue
+
+            with open(path, "r") as f:
+                statements = f.read()
+
+            with conn, conn.cursor() as cursor:
+                cursor.execute(statements)
+                cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", [name])
+            my_logger.info(f"Applied migration {name}")
+            applied.append(name)
+    finally:
+        connections.putconn(conn)
+
+    if applied:
+        invalidate_set_totals()
+
+    return applied
+
+
+def refresh_views():
+    """
+    Refreshes the set totals views after the MTGJSON tables were reloaded and drops the cached totals.
+    Views that do not exist yet are skipped.
+    """
+    connections = get_connection_pool()
+    conn = connections.getconn()
+
+    try:
+        with conn, conn.cursor() as cursor:
+            for view in MATERIALIZED_VIEWS:
+                cursor.execute("SELECT to_regclass(%s)", [view])
+                if cursor.fetchone()[0] is None:
+                    continue
+                cursor.execute(f"REFRESH MATERIALIZED VIEW {view}")
+                my_logger.info(f"Refreshed {view}")
+    finally:
+        connections.putconn(conn)
+
+    invalidate_set_totals()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Creates the indexes and views setchecker relies on in a loaded MTGJSON database."
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="refresh the materialized views, run it after every data load",
+    )
+    args = parser.parse_args()
+
+    migrate()
+    if args.refresh:
+        refresh_views()
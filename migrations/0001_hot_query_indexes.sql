@@ -0,0 +1,6 @@
+-- Indexes for the predicates setchecker queries on every run.
+CREATE INDEX IF NOT EXISTS cards_name_idx ON cards (name);
+CREATE INDEX IF NOT EXISTS setboostersheetcards_carduuid_setcode_idx ON setboostersheetcards (carduuid, setcode);
+CREATE INDEX IF NOT EXISTS setboostersheetcards_setcode_sheetname_boostername_idx ON setboostersheetcards (setcode, sheetname, boostername);
+CREATE INDEX IF NOT EXISTS setboostercontents_setcode_sheetname_boostername_idx ON setboostercontents (setcode, sheetname, boostername);
+CREATE INDEX IF NOT EXISTS setboostercontentweights_setcode_boostername_boosterindex_idx ON setboostercontentweights (setcode, boostername, boosterindex);
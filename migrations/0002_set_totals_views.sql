@@ -0,0 +1,14 @@
+-- Per set weight totals used by fetch_booster_totals and fetch_sheet_totals, refresh them after every data load.
+CREATE MATERIALIZED VIEW IF NOT EXISTS set_booster_totals AS
+SELECT setcode, boostername, SUM(boosterweight) AS total_booster_weight
+FROM setboostercontentweights
+GROUP BY setcode, boostername;
+
+CREATE UNIQUE INDEX IF NOT EXISTS set_booster_totals_setcode_boostername_idx ON set_booster_totals (setcode, boostername);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS set_sheet_totals AS
+SELECT setcode, sheetname, boostername, SUM(cardweight) AS total_weight
+FROM setboostersheetcards
+GROUP BY setcode, sheetname, boostername;
+
+CREATE UNIQUE INDEX IF NOT EXISTS set_sheet_totals_setcode_sheetname_boostername_idx ON set_sheet_totals (setcode, sheetname, boostername);
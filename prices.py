@@ -0,0 +1,38 @@
+import csv
+import json
+from typing import Dict, Tuple
+
+FINISHES = {"nonfoil", "foil", "etched"}
+
+
+def load_prices(path: str) -> Dict[Tuple[str, str], float]:
+    """
+    Loads a local price table keyed by (card uuid, finish). Accepts
+        - CSV with uuid, finish and price columns
+        - JSON as a list of {"uuid", "finish", "price"} records, or as {uuid: {finish: price}}
+    Rows without a price are skipped.
+    """
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            records = (
+                {"uuid": uuid, "finish": finish, "price": price}
+                for uuid, finishes in data.items()
+                for finish, price in finishes.items()
+            )
+        else:
+            records = data
+    else:
+        with open(path, "r", newline="") as f:
+            records = list(csv.DictReader(f))
+
+    prices = {}
+    for record in records:
+        finish = (record.get("finish") or "nonfoil").strip().lower()
+        if finish not in FINISHES:
+            raise ValueError(f"Unknown finish {finish} for {record.get('uuid')}.")
+        if record.get("price") in (None, ""):
+            continue
+        prices[(record["uuid"], finish)] = float(record["price"])
+    return prices
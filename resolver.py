@@ -0,0 +1,100 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Matches scoring below this are reported without a name.
+MIN_CONFIDENCE = 0.6
+
+FACE_SEPARATOR = " // "
+
+# Letters NFKD does not decompose into a base letter.
+_LIGATURES = str.maketrans({"æ": "ae", "Æ": "ae", "œ": "oe", "Œ": "oe", "ß": "ss", "ø": "o", "Ø": "o"})
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(name: str) -> str:
+    """
+    Case, accent and punctuation insensitive form of a card name: "Lim-Dûl's Vault" -> "lim dul s vault".
+    """
+    decomposed = unicodedata.normalize("NFKD", name.translate(_LIGATURES))
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(" ", stripped.casefold()).strip()
+
+
+def _trigrams(key: str) -> List[str]:
+    padded = f"  {key} "
+    return list({padded[i : i + 3] for i in range(len(padded) - 2)})
+
+
+@dataclass(slots=True)
+class NameMatch:
+    query: str
+    name: Optional[str]
+    confidence: float
+
+
+class NameResolver:
+    """
+    Resolves deck entries to canonical card names. Names are indexed in their normalized form, together with
+    the faces of split and double faced cards, so "fire" resolves to "Fire // Ice" with full confidence.
+    Other misspellings fall back to a trigram index, scored with the Dice coefficient of the shared trigrams.
+    """
+
+    def __init__(self, names: Iterable[Tuple[str, Optional[str]]]):
+        self._exact: Dict[str, str] = {}
+        for name, face_name in names:
+            if not name:
+                continue
+            self._exact.setdefault(normalize(name), name)
+            faces = name.split(FACE_SEPARATOR) + ([face_name] if face_name else [])
+            for face in faces:
+                # A full card name wins over a face of another card with the same name.
+                self._exact.setdefault(normalize(face), name)
+
+        self._keys = list(self._exact)
+        postings: Dict[str, List[int]] = {}
+        gram_counts = np.empty(len(self._keys), dtype=np.float64)
+        for index, key in enumerate(self._keys):
+            grams = _trigrams(key)
+            gram_counts[index] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(index)
+
+        self._gram_counts = gram_counts
+        self._postings = {
+            gram: np.array(indexes, dtype=np.int32) for gram, indexes in postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def resolve(self, query: str, min_confidence: float = MIN_CONFIDENCE) -> NameMatch:
+        key = normalize(query)
+        name = self._exact.get(key)
+        if name is not None:
+            return NameMatch(query, name, 1.0)
+
+        grams = _trigrams(key)
+        matched = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not matched:
+            return NameMatch(query, None, 0.0)
+
+        shared = np.bincount(np.concatenate(matched), minlength=len(self._keys))
+        scores = 2 * shared / (len(grams) + self._gram_counts)
+        best = int(scores.argmax())
+        confidence = float(scores[best])
+        name = self._exact[self._keys[best]] if confidence >= min_confidence else None
+        return NameMatch(query, name, confidence)
+
+    def resolve_many(
+        self, queries: Iterable[str], min_confidence: float = MIN_CONFIDENCE
+    ) -> Dict[str, NameMatch]:
+        """
+        Resolves a batch of names, each distinct name once. Returns a Dict keyed by query.
+        """
+        return {
+            query: self.resolve(query, min_confidence) for query in dict.fromkeys(queries)
+        }
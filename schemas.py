@@ -1,8 +1,9 @@
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+import functools
+from dataclasses import dataclass, field, fields, is_dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple, Union, get_args, get_origin, get_type_hints
 
 
-@dataclass
+@dataclass(slots=True)
 class ForeignData:
     language: str
     name: str
@@ -13,7 +14,7 @@ class ForeignData:
     type: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Identifiers:
     card_kingdom_id: str
     scryfall_id: str
@@ -37,14 +38,14 @@ class Identifiers:
     tcgplayer_etched_product_id: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class LeadershipSkills:
     brawl: bool
     commander: bool
     oathbreaker: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class Legalities:
     alchemy: Optional[str] = None
     brawl: Optional[str] = None
@@ -71,7 +72,7 @@ class Legalities:
     vintage: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class PurchaseUrls:
     card_kingdom: Optional[str] = None
     card_kingdom_etched: Optional[str] = None
@@ -81,45 +82,45 @@ class PurchaseUrls:
     tcgplayer_etched: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class RelatedCards:
     reverseRelated: Optional[List[str]]
     spellbook: Optional[List[str]]
 
 
-@dataclass
+@dataclass(slots=True)
 class Rulings:
     date: str
     text: str
 
 
-@dataclass
+@dataclass(slots=True)
 class SourceProducts:
     foil: List[str]
     nonfoil: List[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class Translations:
-    ancient_greek: Optional[str] = None
-    arabic: Optional[str] = None
-    chinese_simplified: Optional[str] = None
-    chinese_traditional: Optional[str] = None
-    french: Optional[str] = None
-    german: Optional[str] = None
-    hebrew: Optional[str] = None
-    italian: Optional[str] = None
-    japanese: Optional[str] = None
-    korean: Optional[str] = None
-    latin: Optional[str] = None
-    phyrexian: Optional[str] = None
-    portuguese_brazil: Optional[str] = None
-    russian: Optional[str] = None
-    sanskrit: Optional[str] = None
-    spanish: Optional[str] = None
-
-
-@dataclass
+    ancient_greek: Optional[str] = field(default=None, metadata={"json": "Ancient Greek"})
+    arabic: Optional[str] = field(default=None, metadata={"json": "Arabic"})
+    chinese_simplified: Optional[str] = field(default=None, metadata={"json": "Chinese Simplified"})
+    chinese_traditional: Optional[str] = field(default=None, metadata={"json": "Chinese Traditional"})
+    french: Optional[str] = field(default=None, metadata={"json": "French"})
+    german: Optional[str] = field(default=None, metadata={"json": "German"})
+    hebrew: Optional[str] = field(default=None, metadata={"json": "Hebrew"})
+    italian: Optional[str] = field(default=None, metadata={"json": "Italian"})
+    japanese: Optional[str] = field(default=None, metadata={"json": "Japanese"})
+    korean: Optional[str] = field(default=None, metadata={"json": "Korean"})
+    latin: Optional[str] = field(default=None, metadata={"json": "Latin"})
+    phyrexian: Optional[str] = field(default=None, metadata={"json": "Phyrexian"})
+    portuguese_brazil: Optional[str] = field(default=None, metadata={"json": "Portuguese (Brazil)"})
+    russian: Optional[str] = field(default=None, metadata={"json": "Russian"})
+    sanskrit: Optional[str] = field(default=None, metadata={"json": "Sanskrit"})
+    spanish: Optional[str] = field(default=None, metadata={"json": "Spanish"})
+
+
+@dataclass(slots=True)
 class BoosterPack:
     set_code: str
     booster_name: str
@@ -130,7 +131,7 @@ class BoosterPack:
     booster_weight_ratio: Optional = None
 
 
-@dataclass
+@dataclass(slots=True)
 class SheetCard:
     set_code: str
     booster_name: str
@@ -138,15 +139,16 @@ class SheetCard:
     card_weight: int
     sheet_name: str
     sheet_weight: str
+    sheet_is_foil: Optional[bool] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CardSheet:
     foil: bool
     total_weight: int
 
 
-@dataclass
+@dataclass(slots=True)
 class CardStats:
     uuid: str
     set_code: str
@@ -155,7 +157,7 @@ class CardStats:
     card_weight: int  # on sheet
 
 
-@dataclass
+@dataclass(slots=True)
 class CardSet:
     availability: List[str]
     border_color: str
@@ -175,8 +177,9 @@ class CardSet:
     type: str
     types: List[str]
     uuid: str
-    boosters: Dict
-    sheet_cards: Dict
+    # Filled from the booster tables, not part of the MTGJSON card object.
+    boosters: Dict = field(default_factory=dict, metadata={"json": None})
+    sheet_cards: Dict = field(default_factory=dict, metadata={"json": None})
     artist: Optional[str] = None
     artist_ids: Optional[List[str]] = None
     ascii_name: Optional[str] = None
@@ -234,7 +237,7 @@ class CardSet:
     watermark: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CardToken:
     availability: List[str]
     border_color: str
@@ -291,14 +294,14 @@ class CardToken:
     watermark: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CardSetDeck:
     count: int
     uuid: str
     is_foil: Optional[bool] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class DeckSet:
     code: str
     main_board: List[CardSetDeck]
@@ -310,7 +313,7 @@ class DeckSet:
     commander: Optional[List[CardSetDeck]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class SealedProductCard:
     name: str
     number: str
@@ -319,24 +322,24 @@ class SealedProductCard:
     foil: Optional[bool] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class SealedProductDeck:
     name: str
     set: str
 
 
-@dataclass
+@dataclass(slots=True)
 class SealedProductOther:
     name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class SealedProductPack:
     code: str
     set: str
 
 
-@dataclass
+@dataclass(slots=True)
 class SealedProductSealed:
     count: int
     name: str
@@ -344,7 +347,7 @@ class SealedProductSealed:
     uuid: str
 
 
-@dataclass
+@dataclass(slots=True)
 class SealedProductContents:
     card: Optional[List[SealedProductCard]] = None
     deck: Optional[List[SealedProductDeck]] = None
@@ -353,7 +356,7 @@ class SealedProductContents:
     sealed: Optional[List[SealedProductSealed]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class SealedProduct:
     identifiers: Identifiers
     name: str
@@ -367,7 +370,7 @@ class SealedProduct:
     release_date: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Set:
     base_set_size: int
     cards: List[CardSet]
@@ -398,3 +401,104 @@ class Set:
     sealed_product: Optional[List[SealedProduct]] = None
     tcgplayer_group_id: Optional[int] = None
     token_set_code: Optional[str] = None
+
+
+def _camel_case(name: str) -> str:
+    head, *tail = name.split("_")
+    return head + "".join(part[:1].upper() + part[1:] for part in tail)
+
+
+def _json_key(dataclass_field) -> Optional[str]:
+    """
+    The MTGJSON key of a field: its "json" metadata when set (None for fields that are not in the JSON),
+    otherwise the camelCase form of its name.
+    """
+    return dataclass_field.metadata.get("json", _camel_case(dataclass_field.name))
+
+
+def _nested_dataclass(annotation) -> Tuple[Optional[type], bool]:
+    """
+    Returns the dataclass an annotation holds and whether it is a list of them, (None, False) for other types.
+    """
+    if get_origin(annotation) is Union:
+        annotation = next((arg for arg in get_args(annotation) if arg is not type(None)), None)
+    if get_origin(annotation) in (list, List):
+        args = get_args(annotation)
+        if args and is_dataclass(args[0]):
+            return args[0], True
+    elif is_dataclass(annotation):
+        return annotation, False
+    return None, False
+
+
+def _compile(name: str, source: str, namespace: Dict) -> Callable:
+    exec(compile(source, f"<{name}>", "exec"), namespace)
+    return namespace[name]
+
+
+def _compile_json_decoder(cls: type) -> Callable:
+    """
+    Generates from_json for cls: a function that builds cls from an MTGJSON object with plain dict lookups,
+    the camelCase keys and nested decoders are resolved once here instead of on every call.
+    Fields without a JSON key can be passed as keyword arguments.
+    """
+    hints = get_type_hints(cls)
+    namespace = {"cls": cls}
+    arguments = []
+    for index, dataclass_field in enumerate(fields(cls)):
+        key = _json_key(dataclass_field)
+        if key is None:
+            continue
+
+        nested, is_list = _nested_dataclass(hints[dataclass_field.name])
+        if nested is None:
+            arguments.append(f"{dataclass_field.name}=get({key!r})")
+            continue
+
+        namespace[f"decode_{index}"] = nested.from_json
+        if is_list:
+            value = f"[decode_{index}(item) for item in value_{index}]"
+        else:
+            value = f"decode_{index}(value_{index})"
+        arguments.append(
+            f"{dataclass_field.name}=None if (value_{index} := get({key!r})) is None else {value}"
+        )
+
+    source = (
+        "def from_json(data, **extra):\n"
+        "    get = data.get\n"
+        f"    return cls({', '.join(arguments + ['**extra'])})\n"
+    )
+    return _compile("from_json", source, namespace)
+
+
+@functools.lru_cache(maxsize=None)
+def row_decoder(
+    cls: type, row_fields: Tuple[str, ...], list_fields: FrozenSet[str] = frozenset()
+) -> Callable:
+    """
+    Generates a decoder for database rows keyed by field name, like the card rows setchecker fetches.
+    The list_fields hold comma separated text in the database and are split into lists.
+    Fields the row does not hold can be passed as keyword arguments.
+    """
+    arguments = []
+    for index, name in enumerate(row_fields):
+        if name in list_fields:
+            arguments.append(
+                f"{name}=value_{index}.split(',') if (value_{index} := row[{name!r}]) else []"
+            )
+        else:
+            arguments.append(f"{name}=row[{name!r}]")
+
+    source = (
+        "def decode(row, **extra):\n"
+        f"    return cls({', '.join(arguments + ['**extra'])})\n"
+    )
+    return _compile("decode", source, {"cls": cls})
+
+
+# Classes in definition order, so nested decoders exist before the classes that use them.
+for _cls in list(globals().values()):
+    if isinstance(_cls, type) and is_dataclass(_cls) and _cls.__module__ == __name__:
+        _cls.from_json = staticmethod(_compile_json_decoder(_cls))
+del _cls
@@ -1,9 +1,100 @@
+import argparse
+from contextlib import nullcontext
+
+import ijson
+
+from scryfall import ScryfallClient
+
 data[["Count", "Card_Name"]] = data["bulk"].str.extract(RGX_PATTERN)
 
-json_responses = []
+scryfall_client = ScryfallClient()
+
+# Printings stored per transaction by ingest_bulk_data.
+BULK_COMMIT_EVERY = 1000
+
+
+# Names of process_card's arguments, the fields of the printings CardSetBatchWriter collects.
+PRINTING_FIELDS = ("card_name", "set_name", "rarity", "foil", "foil_type", "card_code", "card_type")
+
+# (table, id column, value column) of the single column dimension tables, keyed by printing field.
+DIMENSIONS = {
+    "card_name": ("Cards", "card_id", "card_name"),
+    "set_name": ("Sets", "set_id", "set_name"),
+    "rarity": ("Rarities", "rarity_id", "rarity_name"),
+    "card_code": ("CardCode", "card_code_id", "card_code"),
+    "card_type": ("CardType", "card_type_id", "card_type"),
+}
+
+
+def _foil_key(foil, foil_type):
+    """
+    Key of a Foil row: foil_type is the extras.Json of process_card or the list psycopg2 reads back from jsonb.
+    """
+    finishes = getattr(foil_type, "adapted", foil_type)
+    return foil, tuple(finishes) if finishes is not None else None
+
+
+class DimensionCache:
+    """
+    Maps the natural keys of the dimension tables to their ids, (foil, finishes) for Foil, so most lookups
+    never reach the database. All tables are loaded on first use, ids the insert paths look up or create
+    are added as they go. Clear it when a transaction that created ids is rolled back.
+    """
+
+    def __init__(self):
+        self.ids = None
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        self.ids = {}
+        for field, (table, id_column, value_column) in DIMENSIONS.items():
+            cur.execute(
+                sql.SQL("SELECT {id_column}, {value_column} FROM {table}").format(
+                    table=sql.Identifier(table.lower()),
+                    id_column=sql.Identifier(id_column),
+                    value_column=sql.Identifier(value_column),
+                )
+            )
+            self.ids[field] = {value: row_id for row_id, value in cur.fetchall()}
+
+        cur.execute("SELECT foil_id, foil, foil_type FROM Foil")
+        self.ids["foil"] = {
+            _foil_key(foil, foil_type): foil_id for foil_id, foil, foil_type in cur.fetchall()
+        }
+        my_logger.info(
+            f"Loaded dimension ids: { {field: len(ids) for field, ids in self.ids.items()} }"
+        )
+
+    def get(self, field, key):
+        if self.ids is None:
+            self._load()
+        row_id = self.ids[field].get(key)
+        if row_id is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return row_id
+
+    def put(self, field, key, row_id):
+        if self.ids is None:
+            self._load()
+        if row_id is not None:
+            self.ids[field][key] = row_id
+        return row_id
+
+    def clear(self):
+        self.ids = None
+
+
+dimension_cache = DimensionCache()
 
 
 def insert_card(card_name):
+    row_id = dimension_cache.get("card_name", card_name)
+    if row_id is not None:
+        return row_id
+
     try:
         cur.execute(
             sql.SQL(
@@ -18,15 +109,19 @@ def insert_card(card_name):
         )
         result = cur.fetchone()
         if result:
-            return result[0]
+            return dimension_cache.put("card_name", card_name, result[0])
         logging.info(f"Card '{card_name}' was not inserted, likely due to a conflict.")
-        return get_card_id(card_name)
+        return dimension_cache.put("card_name", card_name, get_card_id(card_name))
     except Exception as e:
         logging.error(f"Error inserting card '{card_name}': {e}")
         raise
 
 
 def insert_set(set_name):
+    row_id = dimension_cache.get("set_name", set_name)
+    if row_id is not None:
+        return row_id
+
     try:
         cur.execute(
             sql.SQL(
@@ -41,15 +136,19 @@ def insert_set(set_name):
         )
         result = cur.fetchone()
         if result:
-            return result[0]  # Extract the card_id
+            return dimension_cache.put("set_name", set_name, result[0])
         logging.info(f"Set '{set_name}' was not inserted, likely due to a conflict.")
-        return get_set_id(set_name)
+        return dimension_cache.put("set_name", set_name, get_set_id(set_name))
     except Exception as e:
         logging.error(f"Error inserting set '{set_name}': {e}")
         raise
 
 
 def insert_rarity(rarity_name):
+    row_id = dimension_cache.get("rarity", rarity_name)
+    if row_id is not None:
+        return row_id
+
     try:
         cur.execute(
             sql.SQL(
@@ -64,17 +163,21 @@ def insert_rarity(rarity_name):
         )
         result = cur.fetchone()
         if result:
-            return result[0]  # Extract the card_id
+            return dimension_cache.put("rarity", rarity_name, result[0])
         logging.info(
             f"Rarity '{rarity_name}' was not inserted, likely due to a conflict."
         )
-        return get_rarity_id(rarity_name)
+        return dimension_cache.put("rarity", rarity_name, get_rarity_id(rarity_name))
     except Exception as e:
         logging.error(f"Error inserting rarity'{rarity_name}': {e}")
         raise
 
 
 def insert_foil(foil, foil_type):
+    row_id = dimension_cache.get("foil", _foil_key(foil, foil_type))
+    if row_id is not None:
+        return row_id
+
     try:
         cur.execute(
             sql.SQL(
@@ -89,15 +192,21 @@ def insert_foil(foil, foil_type):
         )
         result = cur.fetchone()
         if result:
-            return result[0]  # Extract the card_id
+            return dimension_cache.put("foil", _foil_key(foil, foil_type), result[0])
         logging.info(f"Foil '{foil_type}' was not inserted, likely due to a conflict.")
-        return get_foil_id(foil, foil_type)
+        return dimension_cache.put(
+            "foil", _foil_key(foil, foil_type), get_foil_id(foil, foil_type)
+        )
     except Exception as e:
         logging.error(f"Error inserting foil type'{foil_type}': {e}")
         raise
 
 
 def insert_card_code(card_code):
+    row_id = dimension_cache.get("card_code", card_code)
+    if row_id is not None:
+        return row_id
+
     try:
         cur.execute(
             sql.SQL(
@@ -112,17 +221,21 @@ def insert_card_code(card_code):
         )
         result = cur.fetchone()
         if result:
-            return result[0]  # Extract the card_id
+            return dimension_cache.put("card_code", card_code, result[0])
         logging.info(
             f"Card code '{card_code}' was not inserted, likely due to a conflict."
         )
-        return get_card_code_id(card_code)
+        return dimension_cache.put("card_code", card_code, get_card_code_id(card_code))
     except Exception as e:
         logging.error(f"Error inserting card code'{card_code}': {e}")
         raise
 
 
 def insert_card_type(card_type):
+    row_id = dimension_cache.get("card_type", card_type)
+    if row_id is not None:
+        return row_id
+
     try:
         cur.execute(
             sql.SQL(
@@ -137,11 +250,11 @@ def insert_card_type(card_type):
         )
         result = cur.fetchone()
         if result:
-            return result[0]  # Extract the card_id
+            return dimension_cache.put("card_type", card_type, result[0])
         logging.info(
             f"Card type '{card_type}' was not inserted, likely due to a conflict."
         )
-        return get_card_type_id(card_type)
+        return dimension_cache.put("card_type", card_type, get_card_type_id(card_type))
     except Exception as e:
         logging.error(f"Error inserting card code'{card_type}': {e}")
         raise
@@ -241,15 +354,42 @@ def get_card_type_id(card_type):
     return result[0] if result else None
 
 
-def get_card_name(card_name):
+def get_card_name(card_name, resolver=None):
+    """
+    Returns the stored name of a card, None when it is not stored. With a resolver.NameResolver the name is
+    resolved first, see resolve_card_name.
+    """
     cur.execute(
         sql.SQL("SELECT card_name FROM Cards WHERE card_name = %s"),
-        [card_name],
+        [resolve_card_name(card_name, resolver)],
     )
     result = cur.fetchone()
     return result[0] if result else None
 
 
+def resolve_card_name(card_name, resolver=None):
+    """
+    Returns the canonical name of a deck entry: card_name when there is no resolver or it is stored as written,
+    otherwise the name the resolver.NameResolver resolves it to, so typos and single faces of split cards are
+    looked up and searched under the card's real name. Unresolved names are returned as they are.
+    """
+    if resolver is None:
+        return card_name
+
+    cur.execute(
+        sql.SQL("SELECT 1 FROM Cards WHERE card_name = %s"),
+        [card_name],
+    )
+    if cur.fetchone():
+        return card_name
+
+    match = resolver.resolve(card_name)
+    if match.name is None:
+        return card_name
+    my_logger.info(f"Resolved '{card_name}' to '{match.name}' (confidence {match.confidence:.2f})")
+    return match.name
+
+
 def get_card_sets(card_name):
     cur.execute(
         sql.SQL(
@@ -273,36 +413,46 @@ def get_card_sets(card_name):
         return None
 
 
-def get_sets(card_name):
-    # base_url = "https://api.scryfall.com/cards/named"
-    # params = {"fuzzy": card_name}
-
-    card_name_perc_enc = card_name.replace(" ", "%21")
-    base_url = (
-        f"https://api.scryfall.com/cards/search?q=%21{card_name_perc_enc}&unique=prints"
-    )
-    response = None
-
+def search_prints(card_name, client=None):
+    """
+    Returns the first page of the Scryfall search for every printing of card_name, None when the search fails.
+    """
+    client = client or scryfall_client
     try:
-        response = requests.get(base_url, timeout=5)
-        response.raise_for_status()
-        print(response.url)
-        return response.json()
+        return client.search_prints(card_name)
 
     except requests.exceptions.RequestException as e:
         logging.error(f"Request error for {card_name}: {e}")
         return None
 
     except ValueError as e:
-        if response is not None:
-            logging.error(
-                f"Error parsing JSON for {card_name}. Response: {response.text}. Error: {e}"
-            )
-        else:
-            logging.error(f"Error parsing JSON for {card_name}. Error: {e}")
+        logging.error(f"Error parsing JSON for {card_name}. Error: {e}")
         return None
 
 
+def get_sets(card_name, client=None, first_page=None):
+    """
+    Yields every printing of card_name one at a time, following the pages of the search lazily, see
+    ScryfallClient.pages. first_page can hold the first page when it was fetched already. Stops after
+    logging the error when a request fails.
+    """
+    client = client or scryfall_client
+    if first_page is None:
+        first_page = search_prints(card_name, client)
+    if not first_page or "data" not in first_page:
+        return
+
+    try:
+        for page in client.pages(first_page):
+            yield from page.get("data", [])
+
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Request error for the next page of {card_name}: {e}")
+
+    except ValueError as e:
+        logging.error(f"Error parsing JSON for the next page of {card_name}. Error: {e}")
+
+
 def process_card(
     card_name, set_name, rarity_name, foil, foil_type, card_code, card_type
 ):
@@ -322,45 +472,234 @@ def process_card(
         )
 
 
-def process_card_data(card_name):
-    print(f"Processing card: {card_name}")
+class CardSetBatchWriter:
+    """
+    Collects printings, in process_card's arguments, and stores them per batch: one multi-row statement per
+    dimension table inserts the missing values and returns the ids of all of them, one more inserts the
+    missing CardSets rows. Values whose ids are already in dimension_cache are left out of the statements.
+    Each batch is committed on its own, or rolled back as a whole when it fails.
+    The tables have no unique constraints to use ON CONFLICT on, so new rows are found with NOT EXISTS.
+    """
 
-    card_variants = get_sets(card_name)
-
-    if card_variants and "data" in card_variants:
-        for variant in card_variants.get("data", []):
-            card_name = variant.get("name")
-            set_name = variant.get("set_name")
-            rarity = variant.get("rarity")
-            foil = variant.get("foil", False)
-            foil_type = variant.get("finishes", [])
-            card_code = variant.get("collector_number")
-            card_type = variant.get("type_line")
-
-            if not foil_type:
-                foil_type = None
-                foil = None
-            else:
-                foil = "foil" in foil_type
-
-            foil_type_json = extras.Json(foil_type) if foil_type else None
-
-            if card_name and set_name and rarity and card_code and card_type:
-                process_card(
-                    card_name,
-                    set_name,
-                    rarity,
-                    foil,
-                    foil_type_json,
-                    card_code,
-                    card_type,
+    def __init__(self, batch_size=BULK_COMMIT_EVERY):
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, card_name, set_name, rarity_name, foil, foil_type, card_code, card_type):
+        self.pending.append(
+            (card_name, set_name, rarity_name, foil, foil_type, card_code, card_type)
+        )
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def _dimension_ids(self, table, id_column, value_column, values):
+        rows = extras.execute_values(
+            cur,
+            sql.SQL(
+                """WITH input (value) AS (VALUES %s),
+                inserted AS (
+                    INSERT INTO {table} ({value_column})
+                    SELECT DISTINCT value FROM input
+                    WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {value_column} = input.value)
+                    RETURNING {id_column}, {value_column}
                 )
+                SELECT {id_column}, {value_column} FROM inserted
+                UNION ALL
+                SELECT {id_column}, {value_column} FROM {table}
+                WHERE {value_column} IN (SELECT value FROM input)"""
+            ).format(
+                table=sql.Identifier(table.lower()),
+                id_column=sql.Identifier(id_column),
+                value_column=sql.Identifier(value_column),
+            ),
+            [(value,) for value in values],
+            page_size=len(values),
+            fetch=True,
+        )
+        return {value: row_id for row_id, value in rows}
+
+    def _foil_ids(self, foils):
+        rows = extras.execute_values(
+            cur,
+            """WITH input (foil, foil_type) AS (VALUES %s),
+            inserted AS (
+                INSERT INTO Foil (foil, foil_type)
+                SELECT DISTINCT foil, foil_type FROM input
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM Foil
+                    WHERE Foil.foil IS NOT DISTINCT FROM input.foil
+                    AND Foil.foil_type IS NOT DISTINCT FROM input.foil_type
+                )
+                RETURNING foil_id, foil, foil_type
+            )
+            SELECT foil_id, foil, foil_type FROM inserted
+            UNION ALL
+            SELECT foil_id, Foil.foil, Foil.foil_type FROM Foil
+            JOIN input ON Foil.foil IS NOT DISTINCT FROM input.foil
+            AND Foil.foil_type IS NOT DISTINCT FROM input.foil_type""",
+            list(foils.values()),
+            template="(%s::boolean, %s::jsonb)",
+            page_size=len(foils),
+            fetch=True,
+        )
+        return {_foil_key(foil, foil_type): foil_id for foil_id, foil, foil_type in rows}
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        try:
+            columns = dict(zip(PRINTING_FIELDS, zip(*self.pending)))
+            for field, (table, id_column, value_column) in DIMENSIONS.items():
+                values = dict.fromkeys(columns[field])
+                missing = [value for value in values if dimension_cache.get(field, value) is None]
+                if missing:
+                    found = self._dimension_ids(table, id_column, value_column, missing)
+                    for value, row_id in found.items():
+                        dimension_cache.put(field, value, row_id)
+
+            foils = {
+                _foil_key(foil, foil_type): (foil, foil_type)
+                for foil, foil_type in zip(columns["foil"], columns["foil_type"])
+            }
+            missing = {key: foil for key, foil in foils.items() if dimension_cache.get("foil", key) is None}
+            if missing:
+                for key, foil_id in self._foil_ids(missing).items():
+                    dimension_cache.put("foil", key, foil_id)
+
+            ids = dimension_cache.ids
+
+            card_sets = list(
+                dict.fromkeys(
+                    (
+                        ids["card_name"][card_name],
+                        ids["set_name"][set_name],
+                        ids["rarity"][rarity_name],
+                        ids["foil"][_foil_key(foil, foil_type)],
+                        ids["card_code"][card_code],
+                        ids["card_type"][card_type],
+                    )
+                    for card_name, set_name, rarity_name, foil, foil_type, card_code, card_type in self.pending
+                )
+            )
+            extras.execute_values(
+                cur,
+                """INSERT INTO CardSets (card_id, set_id, rarity_id, foil_id, card_code_id, card_type_id)
+                SELECT * FROM (VALUES %s) AS input (card_id, set_id, rarity_id, foil_id, card_code_id, card_type_id)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM CardSets
+                    WHERE CardSets.card_id = input.card_id AND CardSets.set_id = input.set_id
+                    AND CardSets.rarity_id = input.rarity_id AND CardSets.foil_id = input.foil_id
+                    AND CardSets.card_code_id = input.card_code_id AND CardSets.card_type_id = input.card_type_id
+                )""",
+                card_sets,
+                page_size=len(card_sets),
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            # Ids created in the batch are gone with it.
+            dimension_cache.clear()
+            logging.error(f"Error writing a batch of {len(self.pending)} printings: {e}")
+            raise
+
+        self.written += len(self.pending)
+        self.pending = []
+
+
+def extract_card_fields(variant):
+    """
+    Extracts the process_card arguments from a Scryfall card object: name, set name, rarity, foil, finishes,
+    collector number and type line. Returns None when one of the required fields is missing.
+    """
+    card_name = variant.get("name")
+    set_name = variant.get("set_name")
+    rarity = variant.get("rarity")
+    foil = variant.get("foil", False)
+    foil_type = variant.get("finishes", [])
+    card_code = variant.get("collector_number")
+    card_type = variant.get("type_line")
+
+    if not foil_type:
+        foil_type = None
+        foil = None
+    else:
+        foil = "foil" in foil_type
+
+    foil_type_json = extras.Json(foil_type) if foil_type else None
+
+    if card_name and set_name and rarity and card_code and card_type:
+        return card_name, set_name, rarity, foil, foil_type_json, card_code, card_type
+    return None
+
+
+def process_card_data(card_name, card_variants=None, writer=None):
+    """
+    Stores every printing of card_name. card_variants is an iterable of Scryfall card objects, by default
+    the printings get_sets yields. The printings are added to writer, or written as one batch when no
+    CardSetBatchWriter is given.
+    """
+    print(f"Processing card: {card_name}")
+
+    if card_variants is None:
+        card_variants = get_sets(card_name)
+
+    found = 0
+    with nullcontext(writer) if writer else CardSetBatchWriter() as batch:
+        for variant in card_variants:
+            found += 1
+            card_fields = extract_card_fields(variant)
+            if card_fields:
+                batch.add(*card_fields)
             else:
                 my_logger.error(f"Invalid variant data for {card_name}: {variant}")
-    else:
+
+    if not found:
         my_logger.error(f"No valid data found for {card_name}")
 
-    time.sleep(1)
+
+def ingest_bulk_data(file_path, card_names=None):
+    """
+    Stores the printings of a downloaded Scryfall bulk-data file (default-cards or all-cards) without any
+    API calls. The file is streamed one card object at a time, so memory stays flat for multi GB files.
+    With card_names only the printings of those cards are stored. The printings are written and committed
+    in batches of BULK_COMMIT_EVERY, see CardSetBatchWriter.
+    """
+    card_names = set(card_names) if card_names else None
+    start = time.perf_counter()
+    hits, misses = dimension_cache.hits, dimension_cache.misses
+
+    with open(file_path, "rb") as f, CardSetBatchWriter() as writer:
+        for variant in ijson.items(f, "item", use_float=True):
+            if card_names is not None and variant.get("name") not in card_names:
+                continue
+
+            card_fields = extract_card_fields(variant)
+            if card_fields is None:
+                my_logger.error(f"Invalid variant data: {variant.get('id')}")
+                continue
+
+            written = writer.written
+            writer.add(*card_fields)
+            if writer.written != written:
+                my_logger.info(
+                    f"Stored {writer.written} printings, "
+                    f"{writer.written / (time.perf_counter() - start):.0f} printings/s"
+                )
+
+    my_logger.info(
+        f"Stored {writer.written} printings in {time.perf_counter() - start:.1f} s, "
+        f"dimension ids: {dimension_cache.hits - hits} cached, {dimension_cache.misses - misses} looked up"
+    )
+    return writer.written
 
 
 def parse_deck(file_path):
@@ -374,14 +713,28 @@ def parse_deck(file_path):
     return deck
 
 
-def get_set_data(deck):
+def get_set_data(deck, client=None, resolver=None):
+    """
+    Looks up the sets of every card in deck. Cards that are not stored yet are searched on Scryfall
+    concurrently, the client's rate limit keeps the requests within Scryfall's limits. Further pages of
+    a search are fetched while the printings of the page before are stored.
+    With a resolver.NameResolver, deck names are resolved to canonical names before the lookup and the
+    search, the result stays keyed by the names in deck.
+    """
+    client = client or scryfall_client
+    names = {card_name: resolve_card_name(card_name, resolver) for card_name in deck}
+    missing = list(
+        dict.fromkeys(name for name in names.values() if get_card_name(name) is None)
+    )
+    first_pages = client.map(lambda card_name: search_prints(card_name, client), missing)
+    with CardSetBatchWriter() as writer:
+        for card_name, first_page in zip(missing, first_pages):
+            # The database writes stay on this thread, they share one cursor.
+            process_card_data(card_name, get_sets(card_name, client, first_page or {}), writer)
+
     card_set_map = {}
     for card_name in deck:
-        if get_card_name(card_name) is None:
-            process_card_data(card_name)
-            time.sleep(1)  # To avoid hitting rate limits on Scryfall
-
-        card_set_map[card_name] = get_card_sets(card_name)
+        card_set_map[card_name] = get_card_sets(names[card_name])
 
     return card_set_map
 
@@ -439,6 +792,14 @@ def recommend_sets(set_distribution):
     #    print(f"{set_name}: {count} cards")
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stores Scryfall card data in the scraper tables.")
+    parser.add_argument("--bulk", help="downloaded Scryfall bulk-data JSON file (default-cards or all-cards)")
+    args = parser.parse_args()
+
+    if args.bulk:
+        ingest_bulk_data(args.bulk)
+
 conn.commit()
 cur.close()
 conn.close()
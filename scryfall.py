@@ -0,0 +1,180 @@
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+my_logger = logging.getLogger("MyLogger")
+
+SCRYFALL_API_URL = os.getenv("SCRYFALL_API_URL", "https://api.scryfall.com")
+
+# Scryfall asks for at most 10 requests per second.
+DEFAULT_RATE = 10.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket: acquire blocks until a token is available, tokens refill at rate per second
+    up to capacity. A capacity of 1 spaces requests evenly, larger capacities allow bursts.
+    pause stops handing out tokens for a while, to every thread.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float):
+        """
+        Hands out no tokens for the next seconds, and starts refilling from empty after that.
+        """
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self.paused_until:
+                self.paused_until = until
+                self.tokens = 0.0
+                self.updated = max(self.updated, until)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ScryfallClient:
+    """
+    Scryfall API client sharing one keep-alive session, rate limited by a token bucket and retrying
+    429 and 5xx responses with exponential backoff, or after the Retry-After the server asks for.
+    A backoff pauses the token bucket, so all threads of map hold off together.
+    base_url can point at a local stub server, it defaults to the SCRYFALL_API_URL environment variable.
+    """
+
+    def __init__(
+        self,
+        base_url: str = SCRYFALL_API_URL,
+        rate: float = DEFAULT_RATE,
+        burst: float = 1.0,
+        max_workers: Optional[int] = None,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        timeout: float = 10.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.bucket = TokenBucket(rate, burst)
+        self.max_workers = max_workers or max(1, math.ceil(rate))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.requests = 0
+        self.retries = 0
+
+        self.session = requests.Session()
+        self.session.headers.update(
+            {"User-Agent": "magic-deck-set-tool/0.1", "Accept": "application/json"}
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def get(self, path: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        GETs a path of the API, or an absolute URL such as a next_page link, and returns the parsed JSON.
+        Returns None for 404, Scryfall's answer to a search without results. Raises requests exceptions once
+        the retries are used up.
+        """
+        url = path if path.startswith(("http://", "https://")) else f"{self.base_url}{path}"
+
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.requests += 1
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                wait = self.backoff * 2**attempt
+                my_logger.warning(f"{e.__class__.__name__} for {url}, retrying in {wait:.1f} s")
+            else:
+                if response.status_code == 404:
+                    return None
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+                retry_after = _retry_after(response)
+                wait = retry_after if retry_after is not None else self.backoff * 2**attempt
+                my_logger.warning(
+                    f"{response.status_code} for {response.url}, retrying in {wait:.1f} s"
+                )
+
+            self.retries += 1
+            # The wait applies to every thread of the client, not just to this request.
+            self.bucket.pause(wait)
+
+    def search_prints(self, card_name: str) -> Optional[Dict]:
+        """
+        Returns the first search page with every printing of the card with exactly this name.
+        """
+        return self.get("/cards/search", {"q": f'!"{card_name}"', "unique": "prints"})
+
+    def pages(self, page: Optional[Dict]) -> Iterator[Dict]:
+        """
+        Yields page and the pages after it, following next_page while has_more is set. The next page is
+        requested on a background thread while the caller works on the current one, so at most two pages
+        are held at a time.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while page:
+                next_page = None
+                if page.get("has_more") and page.get("next_page"):
+                    next_page = executor.submit(self.get, page["next_page"])
+                yield page
+                page = next_page.result() if next_page else None
+
+    def map(self, function: Callable, items: Iterable) -> Iterator:
+        """
+        Runs function over items on up to max_workers threads, the token bucket keeps the combined request
+        rate in check. Yields the results in the order of items.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            yield from executor.map(function, items)
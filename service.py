@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import re
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import asyncpg
+import numpy as np
+from aiohttp import web
+
+import setchecker
+from filters import Has
+from schemas import CardSet
+from setchecker import (
+    CARD_COLUMNS,
+    OPTIONAL_CARD_COLUMNS,
+    _build_cardset,
+    _card_columns,
+    count_sets,
+    my_logger,
+    parse_deck,
+)
+from setcover import recommend_sets
+
+# Request latencies kept for the percentiles reported by /stats.
+LATENCY_WINDOW = 10_000
+
+
+class DeckService:
+    """
+    Runs the fetch_copies -> count_sets pipeline on an asyncpg pool, lands are filtered out by the query.
+    Lookups of the same card name that are in flight at the same time share one database query, so concurrent
+    requests for decks with the same staples only fetch them once.
+    The printings are served without booster data, the pipeline only needs their sets and types.
+    """
+
+    def __init__(self, dsn: Optional[str] = None, min_size: int = 1, max_size: int = 10):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool: Optional[asyncpg.Pool] = None
+        self.columns = _card_columns()
+        # Lands are left out of the set counts, so they are not fetched at all.
+        condition, self.filter_parameters = (~Has("types", "Land")).sql(
+            {**CARD_COLUMNS, **OPTIONAL_CARD_COLUMNS}
+        )
+        placeholders = iter(range(2, len(self.filter_parameters) + 2))
+        self.query = (
+            f"SELECT {', '.join(self.columns.values())} FROM cards "
+            f"WHERE cards.name = ANY($1::text[]) AND "
+            + re.sub("%s", lambda _: f"${next(placeholders)}", condition)
+        )
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.queries = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tasks = set()
+
+    async def start(self):
+        if self.dsn:
+            self.pool = await asyncpg.create_pool(
+                self.dsn, min_size=self.min_size, max_size=self.max_size
+            )
+        else:
+            self.pool = await asyncpg.create_pool(
+                database=setchecker.database,
+                user=setchecker.user,
+                password=setchecker.password,
+                host=setchecker.host,
+                port=int(setchecker.port) if setchecker.port else None,
+                min_size=self.min_size,
+                max_size=self.max_size,
+            )
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+    async def fetch_copies(self, card_names: List[str]) -> Dict[str, List[CardSet]]:
+        """
+        Returns the printings of every card name, joining lookups of names that are already in flight
+        and fetching the remaining names with one query.
+        """
+        card_names = list(dict.fromkeys(card_names))
+        missing = [card_name for card_name in card_names if card_name not in self._inflight]
+        self.coalesced += len(card_names) - len(missing)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {card_name: loop.create_future() for card_name in missing}
+            self._inflight.update(futures)
+            task = asyncio.create_task(self._fetch_batch(futures))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        # Shielded, as other requests share the futures: a cancelled request must not cancel their lookups.
+        futures = [asyncio.shield(self._inflight[card_name]) for card_name in card_names]
+        return dict(zip(card_names, await asyncio.gather(*futures)))
+
+    async def _fetch_batch(self, futures: Dict[str, asyncio.Future]):
+        try:
+            self.queries += 1
+            rows = await self.pool.fetch(self.query, list(futures), *self.filter_parameters)
+            copies = {card_name: [] for card_name in futures}
+            for row in rows:
+                card = dict(zip(self.columns, row))
+                copies.setdefault(card["name"], []).append(_build_cardset(card, {}, {}))
+            for card_name, future in futures.items():
+                if not future.done():
+                    future.set_result(copies[card_name])
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for card_name in futures:
+                self._inflight.pop(card_name, None)
+
+    async def analyze(self, deck_data) -> Dict:
+        copies = await self.fetch_copies([card_name for _, card_name in deck_data])
+
+        set_counts = {}
+        for _, card_name in deck_data:
+            count_sets(copies[card_name], set_counts)
+
+        recommendation = recommend_sets(set_counts, deck_data)
+        return {
+            "Sets": {set_code: value["Count"] for set_code, value in set_counts.items()},
+            "Recommendation": recommendation["Sets"],
+            "Uncovered": recommendation["Uncovered"],
+        }
+
+    def stats(self) -> Dict:
+        latencies = np.array(self.latencies, dtype=float)
+        percentiles = (
+            dict(
+                zip(
+                    ["P50", "P90", "P99"],
+                    np.percentile(latencies, [50, 90, 99]).tolist(),
+                )
+            )
+            if len(latencies)
+            else {"P50": None, "P90": None, "P99": None}
+        )
+        return {
+            "Requests": self.requests,
+            "Queries": self.queries,
+            "CoalescedLookups": self.coalesced,
+            "LatencyMs": percentiles,
+        }
+
+
+async def handle_deck(request: web.Request) -> web.Response:
+    """
+    POST a deck list ("<count> <card name>" per line) as the request body, or as {"deck": "..."} JSON.
+    """
+    service: DeckService = request.app["service"]
+    start = time.perf_counter()
+
+    try:
+        if request.content_type == "application/json":
+            data = await request.json()
+            if not isinstance(data, dict) or not isinstance(data.get("deck", ""), str):
+                raise ValueError('Expected a JSON object with the deck list as a "deck" string.')
+            body = data.get("deck", "")
+        else:
+            body = await request.text()
+
+        deck_data = parse_deck(body.splitlines())
+    except (IndexError, ValueError) as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+    result = await service.analyze(deck_data)
+
+    latency = (time.perf_counter() - start) * 1000
+    service.requests += 1
+    service.latencies.append(latency)
+    my_logger.info(f"Analyzed deck with {len(deck_data)} lines in {latency:.1f} ms")
+
+    result["LatencyMs"] = latency
+    return web.json_response(result)
+
+
+async def handle_stats(request: web.Request) -> web.Response:
+    return web.json_response(request.app["service"].stats())
+
+
+def create_app(service: Optional[DeckService] = None) -> web.Application:
+    app = web.Application()
+    app["service"] = service or DeckService()
+
+    async def lifecycle(app: web.Application):
+        await app["service"].start()
+        yield
+        await app["service"].close()
+
+    app.cleanup_ctx.append(lifecycle)
+    app.router.add_post("/decks", handle_deck)
+    app.router.add_get("/stats", handle_stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves deck analysis over HTTP.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--dsn", help="Postgres DSN, defaults to the DATABASE/USER/... environment variables")
+    parser.add_argument("--pool-size", type=int, default=10)
+    args = parser.parse_args()
+
+    web.run_app(
+        create_app(DeckService(dsn=args.dsn, max_size=args.pool_size)),
+        host=args.host,
+        port=args.port,
+    )
@@ -1,14 +1,30 @@
-import heapq
+import argparse
 import logging
 import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from logging.handlers import RotatingFileHandler
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set, Tuple, Union
 
+import numpy as np
 import psycopg2
 from dotenv import load_dotenv
-from psycopg2 import pool, sql
-
-from schemas import BoosterPack, CardSet, CardStats, SheetCard
+from psycopg2 import errors, pool, sql
+
+import instrumentation
+from deckstore import DEFAULT_STORE_PATH, DeckStore
+from filters import CardFilter, Has, parse_filters
+from prices import load_prices
+from resolver import NameMatch, NameResolver
+from schemas import BoosterPack, CardSet, CardStats, SheetCard, row_decoder
+from setcover import recommend_sets
+from simulator import simulate_sets
+from snapshot import Snapshot
 
 load_dotenv()
 
@@ -41,9 +57,61 @@ my_logger.addHandler(file_handler)
 my_logger.addHandler(console_handler)
 
 
-connection_pool = pool.SimpleConnectionPool(
-    1, 10, database=database, user=user, password=password, host=host, port=port
-)
+POOL_MAX_CONNECTIONS = 10
+
+connection_pool = None
+_pool_lock = threading.Lock()
+# One slot per pooled connection. getconn raises PoolError on an exhausted pool instead of blocking,
+# so _fetch_query waits for a slot first.
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONNECTIONS)
+
+
+def get_connection_pool() -> pool.ThreadedConnectionPool:
+    """
+    Returns the shared thread safe connection pool, creating it on first use.
+    """
+    global connection_pool
+
+    with _pool_lock:
+        if connection_pool is None:
+            connection_pool = pool.ThreadedConnectionPool(
+                1,
+                POOL_MAX_CONNECTIONS,
+                database=database,
+                user=user,
+                password=password,
+                host=host,
+                port=port,
+            )
+        return connection_pool
+
+
+def configure_pool(max_connections: int):
+    """
+    Sets the maximum number of pooled connections, the current pool is closed and recreated on next use.
+    """
+    global connection_pool, POOL_MAX_CONNECTIONS, _pool_slots
+
+    with _pool_lock:
+        POOL_MAX_CONNECTIONS = max_connections
+        _pool_slots = threading.BoundedSemaphore(max_connections)
+        if connection_pool is not None:
+            connection_pool.closeall()
+            connection_pool = None
+
+
+# Offline snapshot used instead of the database when set, see use_snapshot.
+snapshot: Optional[Snapshot] = None
+
+
+def use_snapshot(path: Optional[str]):
+    """
+    Switches the card, booster and sheet lookups to the snapshot at path, or back to the database for None.
+    """
+    global snapshot
+
+    snapshot = Snapshot(path) if path else None
+    invalidate_set_totals()
 
 
 def read_deck(deck_file: str):
@@ -56,84 +124,528 @@ def read_deck(deck_file: str):
     if not os.path.isfile(deck_file):
         raise FileNotFoundError(f"The file {deck_file} does not exist.")
 
+    with open(deck_file, "r") as f:
+        return parse_deck(f)
+
+
+def parse_deck(lines) -> List[Tuple[int, str]]:
+    """
+    Parses deck lines of the form "<count> <card name>", Returns a list with tuples of count and card name.
+    """
     card_data = []
 
-    with open(deck_file, "r") as f:
-        for line in f:
-            line = line.strip()
+    for line in lines:
+        line = line.strip()
 
-            if not line:
-                continue
+        if not line:
+            continue
 
-            parts = line.split(" ", 1)
+        parts = line.split(" ", 1)
 
-            if not parts[0].isdigit():
-                raise ValueError(f"Invalid count '{parts[0]}' in line: {line}")
+        if not parts[0].isdigit():
+            raise ValueError(f"Invalid count '{parts[0]}' in line: {line}")
 
-            count = int(parts[0])
-            card_name = parts[1]
+        count = int(parts[0])
+        card_name = parts[1]
 
-            card_data.append((count, card_name))
+        card_data.append((count, card_name))
 
     return card_data
 
 
+def load_name_resolver() -> NameResolver:
+    """
+    Builds a NameResolver over the distinct card and face names of the database or snapshot.
+    """
+    if snapshot is not None:
+        return NameResolver(snapshot.card_names())
+    return NameResolver(_fetch_query("SELECT DISTINCT name, facename FROM cards"))
+
+
+def resolve_deck(
+    deck_data: List[Tuple[int, str]], resolver: NameResolver
+) -> Tuple[List[Tuple[int, str]], List[NameMatch]]:
+    """
+    Replaces the card names of read_deck output with their canonical names, in one batch.
+    Names that do not resolve are kept as they are. Returns the new deck data and the matches that were not exact.
+    """
+    matches = resolver.resolve_many(card_name for _, card_name in deck_data)
+    resolved = [
+        (count, matches[card_name].name or card_name) for count, card_name in deck_data
+    ]
+    corrections = [match for match in matches.values() if match.name != match.query]
+    return resolved, corrections
+
+
 def _fetch_query(query: str, parameters=None):
     """
     Fetch query shell aiming at concurrency.
+    Every query is reported to the instruments of the instrumentation module with its latency, the time spent
+    waiting for a pooled connection and the number of rows returned.
     """
-    conn = connection_pool.getconn()
-    cursor = conn.cursor()
+    connections = get_connection_pool()
+    slots = _pool_slots
+    start = time.perf_counter()
+    slots.acquire()
+    try:
+        conn = connections.getconn()
+    except Exception:
+        slots.release()
+        raise
+    pool_wait = time.perf_counter() - start
+
+    result = []
+    error = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql.SQL(query), parameters)
+        result = cursor.fetchall()
+        cursor.close()
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        connections.putconn(conn)
+        slots.release()
+        instrumentation.record_query(
+            query, time.perf_counter() - start - pool_wait, pool_wait, len(result), error
+        )
 
-    cursor.execute(sql.SQL(query), parameters)
-    result = cursor.fetchall()
+    return result
 
-    cursor.close()
-    connection_pool.putconn(conn)
 
-    return result
+def _chunks(items: List, count: int) -> List[List]:
+    """
+    Splits items into at most count chunks of similar size, keeping their order.
+    """
+    size = -(-len(items) // max(count, 1))
+    return [items[i : i + size] for i in range(0, len(items), size)] if items else []
+
+
+def _merge_dicts(dicts) -> Dict:
+    merged = {}
+    for d in dicts:
+        merged.update(d)
+    return merged
+
+
+# CardSet field -> cards column, only these columns are selected from the cards table.
+CARD_COLUMNS = {
+    "availability": "availability",
+    "border_color": "bordercolor",
+    "color_identity": "coloridentity",
+    "colors": "colors",
+    "finishes": "finishes",
+    "frame_version": "frameversion",
+    "language": "language",
+    "layout": "layout",
+    "mana_value": "manavalue",
+    "name": "name",
+    "number": "number",
+    "rarity": "rarity",
+    "set_code": "setcode",
+    "subtypes": "subtypes",
+    "supertypes": "supertypes",
+    "type": "type",
+    "types": "types",
+    "uuid": "uuid",
+}
+
+# Optional CardSet fields that can be requested through extra_fields.
+OPTIONAL_CARD_COLUMNS = {
+    "artist": "artist",
+    "ascii_name": "asciiname",
+    "color_indicator": "colorindicator",
+    "edhrec_rank": "edhrecrank",
+    "face_name": "facename",
+    "flavor_text": "flavortext",
+    "frame_effects": "frameeffects",
+    "is_online_only": "isonlineonly",
+    "is_promo": "ispromo",
+    "is_reprint": "isreprint",
+    "keywords": "keywords",
+    "loyalty": "loyalty",
+    "mana_cost": "manacost",
+    "original_release_date": "originalreleasedate",
+    "power": "power",
+    "promo_types": "promotypes",
+    "security_stamp": "securitystamp",
+    "side": "side",
+    "text": "text",
+    "toughness": "toughness",
+    "watermark": "watermark",
+}
+
+# Columns stored as comma separated text.
+LIST_FIELDS = frozenset(
+    {
+        "availability",
+        "color_identity",
+        "color_indicator",
+        "colors",
+        "finishes",
+        "frame_effects",
+        "keywords",
+        "promo_types",
+        "subtypes",
+        "supertypes",
+        "types",
+    }
+)
+
+
+def _card_columns(extra_fields=()) -> Dict[str, str]:
+    """
+    Returns the CardSet field -> cards column mapping to select, including the requested optional fields.
+    """
+    unknown = set(extra_fields) - set(OPTIONAL_CARD_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown optional card fields: {', '.join(sorted(unknown))}")
+
+    columns = dict(CARD_COLUMNS)
+    for field in extra_fields:
+        columns[field] = OPTIONAL_CARD_COLUMNS[field]
+    return columns
+
+
+def _build_cardset(card: Dict, boosters: Dict, sheet_cards: Dict) -> CardSet:
+    """
+    Maps a row of the cards table, keyed by CardSet field, onto a CardSet.
+    """
+    decode = row_decoder(CardSet, tuple(card), LIST_FIELDS)
+    return decode(card, boosters=boosters, sheet_cards=sheet_cards)
 
 
-def fetch_copies(card_name: str) -> List[CardSet]:
+def fetch_copies(card_name: str, extra_fields=()) -> List[CardSet]:
     """
-    Fetches card data based on it's name and puts the data into an instance of the Card class
+    Fetches card data based on it's name and puts the data into an instance of the Card class.
+    extra_fields names optional CardSet fields to fetch on top of the required ones.
     """
+    return fetch_deck_copies([card_name], extra_fields=extra_fields)[card_name]
 
-    card_data = _fetch_query("SELECT * FROM cards WHERE cards.name = %s", [card_name])
-    cardset_list = []
+
+def fetch_deck_copies(
+    card_names: List[str],
+    workers: int = 1,
+    extra_fields=(),
+    lazy: bool = True,
+    card_filter: Optional[CardFilter] = None,
+) -> Dict[str, List[CardSet]]:
+    """
+    Fetches the printings of every card name in one go. Returns a Dict with the card names as keys and
+    their CardSet lists as values. The booster and sheet data of all printings is pulled with a constant
+    number of queries instead of four queries per printing.
+    With workers > 1 the lookups are split into chunks that run in parallel on the connection pool,
+    the results are merged back in chunk order so the output does not depend on the number of workers.
+    With lazy the booster and sheet data is only fetched once a printing's boosters or sheet_cards are
+    accessed, see LazyBoosterData. Pass lazy=False to fetch it right away.
+    Printings that do not match card_filter are left out of the query, see filters.CardFilter.
+    """
+    card_names = list(dict.fromkeys(card_names))
+    deck_copies = {card_name: [] for card_name in card_names}
+    columns = _card_columns(extra_fields)
+
+    if not card_names:
+        return deck_copies
+
+    with ThreadPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+        if executor is not None:
+            card_data = [
+                card
+                for card_rows in executor.map(
+                    lambda chunk: _fetch_card_rows(chunk, columns, card_filter),
+                    _chunks(card_names, workers),
+                )
+                for card in card_rows
+            ]
+        else:
+            card_data = _fetch_card_rows(card_names, columns, card_filter)
+
+        card_sets = {card["uuid"]: card["set_code"] for card in card_data}
+        if lazy:
+            booster_data = _lazy_booster_data(card_sets)
+        else:
+            booster_data = _fetch_booster_data(card_sets, executor, workers)
+
+    return _build_deck_copies(deck_copies, card_data, booster_data)
+
+
+def _build_deck_copies(
+    deck_copies: Dict[str, List[CardSet]],
+    card_data: List[Dict],
+    booster_data: Dict[str, Tuple[Dict, Dict]],
+) -> Dict[str, List[CardSet]]:
+    """
+    Appends a CardSet per card row to the list of its card name in deck_copies.
+    """
     for card in card_data:
-        cardset = CardSet(
-            availability=card[5].split(","),
-            border_color=card[7],
-            color_identity=card[9].split(",") if card[9] else [],
-            colors=card[11].split(",") if card[11] else [],
-            finishes=card[20].split(","),
-            frame_version=card[24],
-            language=card[44],
-            layout=card[45],
-            mana_value=card[50],
-            name=card[51],
-            number=card[52],
-            rarity=card[21],
-            set_code=card[65],
-            subtypes=card[70].split(",") if card[70] else [],
-            supertypes=card[71].split(",") if card[71] else [],
-            type=card[74],
-            types=card[75].split(","),
-            uuid=card[76],
-            boosters=fetch_boosters(card[65], card[76]),
-            sheet_cards=fetch_sheetcards(card[65], card[76]),
+        boosters, sheet_cards = booster_data.get(card["uuid"], ({}, {}))
+        cardset = _build_cardset(card, boosters, sheet_cards)
+        deck_copies.setdefault(cardset.name, []).append(cardset)
+
+    return deck_copies
+
+
+def dataset_version() -> Optional[str]:
+    """
+    Returns the version stamp of the data being read: the snapshot version, or the version and load time in the
+    meta table the importer writes. A meta table from MTGJSON's own dump has no load time, its version and date
+    are used instead. None when the database has no meta table or an empty one.
+    """
+    if snapshot is not None:
+        return snapshot.version
+
+    try:
+        rows = _fetch_query("SELECT version, loaded_at FROM meta")
+    except errors.UndefinedTable:
+        return None
+    except errors.UndefinedColumn:
+        rows = _fetch_query("SELECT version, date FROM meta")
+    if not rows or not any(rows[0]):
+        return None
+    version, stamp = rows[0]
+    if hasattr(stamp, "isoformat"):
+        stamp = stamp.isoformat()
+    return f"{version or ''}@{stamp or ''}"
+
+
+def fetch_deck_copies_incremental(
+    deck_path: str, store: DeckStore, deck_data: Optional[List[Tuple[int, str]]] = None
+) -> Dict[str, List[CardSet]]:
+    """
+    Like fetch_deck_copies for the cards of a deck file, but only fetches the cards that were added to the deck
+    since it was last stored in store for the current dataset version. The printings of the other cards are
+    rebuilt from the store, removed cards are dropped from it. Booster data stays lazy, see LazyBoosterData.
+    Without a dataset version the stored printings could be stale, so every card is fetched and nothing is stored.
+    Only the printing fetch is incremental: the set counts are rebuilt from all printings, which takes no queries,
+    and the booster data of the recommended sets is fetched on every run.
+    """
+    if deck_data is None:
+        deck_data = read_deck(deck_path)
+    card_names = list(dict.fromkeys(card_name for _, card_name in deck_data))
+
+    version = dataset_version()
+    if version is None:
+        my_logger.warning("The dataset has no version stamp, the deck store is not used.")
+        return fetch_deck_copies(card_names)
+    card_name_set = set(card_names)
+
+    _, stored = store.load(deck_path, version)
+    added = [card_name for card_name in card_names if card_name not in stored]
+    removed = [card_name for card_name in stored if card_name not in card_name_set]
+
+    added_rows = {card_name: [] for card_name in added}
+    if added:
+        for card in _fetch_card_rows(added, _card_columns()):
+            added_rows.setdefault(card["name"], []).append(card)
+    store.save(deck_path, version, deck_data, added_rows, removed)
+    my_logger.info(
+        f"Deck store: {len(card_names) - len(added)} cards reused, {len(added)} fetched, {len(removed)} removed"
+    )
+
+    card_data = [
+        card
+        for card_name in card_names
+        for card in (stored[card_name] if card_name in stored else added_rows[card_name])
+    ]
+    return _build_deck_copies(
+        {card_name: [] for card_name in card_names},
+        card_data,
+        _lazy_booster_data({card["uuid"]: card["set_code"] for card in card_data}),
+    )
+
+
+def _fetch_booster_data(
+    card_sets: Dict[str, str], executor: Optional[ThreadPoolExecutor], workers: int
+) -> Dict[str, Tuple[Dict, Dict]]:
+    """
+    Fetches the booster and sheet Dicts of every printing in card_sets, in parallel chunks when an executor is given.
+    Returns a Dict with card uuids as keys and (boosters, sheet_cards) as values.
+    """
+    if executor is None:
+        boosters = fetch_deck_boosters(card_sets)
+        sheet_cards = fetch_deck_sheetcards(card_sets)
+    else:
+        set_codes = sorted(set(card_sets.values()))
+
+        # Warm the set totals cache once so the chunks below do not fetch the same totals.
+        totals = [
+            executor.submit(fetch_booster_totals, set_codes),
+            executor.submit(fetch_sheet_totals, set_codes),
+        ]
+        for future in totals:
+            future.result()
+
+        uuid_chunks = [
+            dict(chunk) for chunk in _chunks(list(card_sets.items()), workers)
+        ]
+        booster_futures = [
+            executor.submit(fetch_deck_boosters, chunk) for chunk in uuid_chunks
+        ]
+        sheet_futures = [
+            executor.submit(fetch_deck_sheetcards, chunk) for chunk in uuid_chunks
+        ]
+        boosters = _merge_dicts(future.result() for future in booster_futures)
+        sheet_cards = _merge_dicts(future.result() for future in sheet_futures)
+
+    return {
+        uuid: (boosters.get(uuid, {}), sheet_cards.get(uuid, {})) for uuid in card_sets
+    }
+
+
+class _PrintingBoosterData:
+    """
+    Booster and sheet data of a single printing, filled in by its _SetBoosterLoader.
+    """
+
+    def __init__(self, loader: "_SetBoosterLoader", uuid: str):
+        self.loader = loader
+        self.uuid = uuid
+        self.boosters = None
+        self.sheet_cards = None
+
+    def resolve(self) -> "_PrintingBoosterData":
+        if self.boosters is None:
+            resolve_booster_loaders([self.loader])
+        return self
+
+
+class _SetBoosterLoader:
+    """
+    Tracks the printings of one set whose booster data has not been fetched yet.
+    Printings are held weakly, so printings that are dropped (e.g. by filter_cards) are never fetched.
+    """
+
+    def __init__(self, set_code: str):
+        self.set_code = set_code
+        self.lock = threading.Lock()
+        self.pending = weakref.WeakValueDictionary()
+
+    def register(self, uuid: str) -> _PrintingBoosterData:
+        printing = _PrintingBoosterData(self, uuid)
+        self.pending[uuid] = printing
+        return printing
+
+
+class LazyBoosterData(Mapping):
+    """
+    Read only Dict stand in for CardSet.boosters and CardSet.sheet_cards.
+    The first access fetches the data of every pending printing of the same set in one batch.
+    """
+
+    def __init__(self, printing: _PrintingBoosterData, attribute: str):
+        self._printing = printing
+        self._attribute = attribute
+
+    def _data(self) -> Dict:
+        return getattr(self._printing.resolve(), self._attribute)
+
+    def __getitem__(self, key):
+        return self._data()[key]
+
+    def __iter__(self):
+        return iter(self._data())
+
+    def __len__(self):
+        return len(self._data())
+
+    def __repr__(self):
+        data = getattr(self._printing, self._attribute)
+        return repr(data) if data is not None else f"{type(self).__name__}(pending)"
+
+
+def _lazy_booster_data(card_sets: Dict[str, str]) -> Dict[str, Tuple[Dict, Dict]]:
+    loaders = {}
+    booster_data = {}
+    for uuid, set_code in card_sets.items():
+        if set_code not in loaders:
+            loaders[set_code] = _SetBoosterLoader(set_code)
+        printing = loaders[set_code].register(uuid)
+        booster_data[uuid] = (
+            LazyBoosterData(printing, "boosters"),
+            LazyBoosterData(printing, "sheet_cards"),
         )
+    return booster_data
+
+
+def resolve_booster_loaders(loaders, workers: int = 1):
+    """
+    Fetches the booster and sheet data of all pending printings of the given loaders with one batch of queries.
+    With workers > 1 the printings are split into chunks whose booster and sheet queries run in parallel,
+    see _fetch_booster_data.
+    """
+    loaders = sorted(set(loaders), key=lambda loader: loader.set_code)
+
+    # Locks are taken in set code order so concurrent resolves can not deadlock.
+    for loader in loaders:
+        loader.lock.acquire()
+    try:
+        pending = {}
+        for loader in loaders:
+            pending.update(loader.pending.items())
+
+        if not pending:
+            return
+
+        card_sets = {uuid: printing.loader.set_code for uuid, printing in pending.items()}
+        with ThreadPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+            booster_data = _fetch_booster_data(card_sets, executor, workers)
 
-        cardset_list.append(cardset)
+        # Printings stay pending until all queries succeeded, so a failed fetch is retried on next access.
+        for uuid, printing in pending.items():
+            printing.loader.pending.pop(uuid, None)
+            printing.boosters, printing.sheet_cards = booster_data[uuid]
+    finally:
+        for loader in loaders:
+            loader.lock.release()
 
-    return cardset_list
+
+def resolve_booster_data(cards: List[CardSet], workers: int = 1):
+    """
+    Fetches the pending booster data of the sets of cards in one batch instead of one batch per set,
+    split over workers parallel connections.
+    """
+    resolve_booster_loaders(
+        (
+            card.boosters._printing.loader
+            for card in cards
+            if isinstance(card.boosters, LazyBoosterData)
+        ),
+        workers=workers,
+    )
 
 
-def filter_cards(cardset_list: List[CardSet], filters: Set[str]):
+def _fetch_card_rows(
+    card_names: List[str], columns: Dict[str, str], card_filter: Optional[CardFilter] = None
+) -> List[Dict]:
     """
-    Removes card sets from cardset_list that match any of the filter types.
+    Fetches the given columns of every printing of card_names that matches card_filter,
+    returns the rows keyed by CardSet field.
     """
+    if snapshot is not None:
+        card_rows = snapshot.card_rows(card_names, columns)
+        if card_filter is not None:
+            card_rows = [card for card in card_rows if card_filter.matches(card)]
+        return card_rows
+
+    query = f"SELECT {', '.join(columns.values())} FROM cards WHERE cards.name = ANY(%s)"
+    parameters = [card_names]
+    if card_filter is not None:
+        condition, filter_parameters = card_filter.sql({**CARD_COLUMNS, **OPTIONAL_CARD_COLUMNS})
+        query += f" AND {condition}"
+        parameters += filter_parameters
+
+    card_data = _fetch_query(query, parameters)
+    return [dict(zip(columns, card)) for card in card_data]
+
+
+def filter_cards(cardset_list: List[CardSet], filters: Union[Set[str], CardFilter]):
+    """
+    Removes card sets from cardset_list that match any of the filter types, or that do not match a CardFilter.
+    """
+    if isinstance(filters, CardFilter):
+        return [cardset for cardset in cardset_list if filters.matches(cardset)]
+
     filtered_cardset_list = [
         cardset for cardset in cardset_list if not filters & set(cardset.types)
     ]
@@ -157,50 +669,265 @@ def count_sets(
     return sets
 
 
+class SetTotalsCache:
+    """
+    Bounded LRU cache for aggregates that only depend on the set code.
+    Keeps hit and miss counters so the cache effectiveness can be inspected.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, set_codes: List[str]) -> Tuple[Dict[str, Dict], List[str]]:
+        """
+        Returns the cached entries of set_codes and the set codes that still need to be fetched.
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for set_code in set_codes:
+                if set_code in self._entries:
+                    self._entries.move_to_end(set_code)
+                    found[set_code] = self._entries[set_code]
+                    self.hits += 1
+                else:
+                    missing.append(set_code)
+                    self.misses += 1
+        return found, missing
+
+    def put(self, set_code: str, entry: Dict):
+        with self._lock:
+            self._entries[set_code] = entry
+            self._entries.move_to_end(set_code)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, set_codes: Optional[List[str]] = None):
+        """
+        Drops the given set codes, or every entry when no set codes are given.
+        """
+        with self._lock:
+            if set_codes is None:
+                self._entries.clear()
+            else:
+                for set_code in set_codes:
+                    self._entries.pop(set_code, None)
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {
+                "Hits": self.hits,
+                "Misses": self.misses,
+                "Size": len(self._entries),
+                "MaxSize": self.maxsize,
+            }
+
+
+booster_totals_cache = SetTotalsCache()
+sheet_totals_cache = SetTotalsCache()
+sheet_foils_cache = SetTotalsCache()
+
+
+# Whether the database has the set totals views, None until checked, see _use_totals_views.
+totals_views_available: Optional[bool] = None
+
+# Whether the database has MTGJSON's setboostersheets table, None until checked, see fetch_sheet_foils.
+booster_sheets_available: Optional[bool] = None
+
+
+def invalidate_set_totals(set_codes: Optional[List[str]] = None):
+    """
+    Invalidates the cached booster and sheet weight totals and sheet foil flags, needs to be called after the
+    MTGJSON data is reloaded.
+    """
+    global totals_views_available, booster_sheets_available
+
+    booster_totals_cache.invalidate(set_codes)
+    sheet_totals_cache.invalidate(set_codes)
+    sheet_foils_cache.invalidate(set_codes)
+    if set_codes is None:
+        totals_views_available = None
+        booster_sheets_available = None
+
+
+def _use_totals_views() -> bool:
+    """
+    Checks once whether the set totals materialized views of migrations/ exist.
+    """
+    global totals_views_available
+
+    if totals_views_available is None:
+        rows = _fetch_query(
+            "SELECT to_regclass('set_booster_totals') IS NOT NULL AND to_regclass('set_sheet_totals') IS NOT NULL"
+        )
+        totals_views_available = bool(rows[0][0])
+    return totals_views_available
+
+
+def set_totals_cache_info() -> Dict:
+    return {
+        "BoosterTotals": booster_totals_cache.info(),
+        "SheetTotals": sheet_totals_cache.info(),
+        "SheetFoils": sheet_foils_cache.info(),
+    }
+
+
+def fetch_booster_totals(set_codes: List[str]) -> Dict[Tuple[str, str], int]:
+    """
+    Fetches the total booster weight per set and booster name, only querying sets that are not cached yet.
+    """
+    found, missing = booster_totals_cache.get_many(set_codes)
+
+    if missing:
+        if snapshot is not None:
+            total_booster_weight = snapshot.booster_total_rows(missing)
+        elif _use_totals_views():
+            total_booster_weight = _fetch_query(
+                """
+                SELECT setcode, boostername, total_booster_weight FROM set_booster_totals
+                WHERE set_booster_totals.setcode = ANY(%s)
+                """,
+                [missing],
+            )
+        else:
+            total_booster_weight = _fetch_query(
+                """
+                SELECT setcode, boostername, SUM(boosterweight) as total_booster_weight FROM setboostercontentweights
+                WHERE setboostercontentweights.setcode = ANY(%s)
+                GROUP BY setcode, boostername
+                """,
+                [missing],
+            )
+
+        fetched = {set_code: {} for set_code in missing}
+        for weight_row in total_booster_weight:
+            fetched[weight_row[0]][weight_row[1]] = weight_row[2]
+
+        for set_code, entry in fetched.items():
+            booster_totals_cache.put(set_code, entry)
+        found.update(fetched)
+
+    return {
+        (set_code, booster_name): total
+        for set_code, entry in found.items()
+        for booster_name, total in entry.items()
+    }
+
+
+def fetch_sheet_totals(set_codes: List[str]) -> Dict[Tuple[str, str, str], int]:
+    """
+    Fetches the total sheet weight per set, sheet and booster name, only querying sets that are not cached yet.
+    """
+    found, missing = sheet_totals_cache.get_many(set_codes)
+
+    if missing:
+        if snapshot is not None:
+            total_sheet_weights = snapshot.sheet_total_rows(missing)
+        elif _use_totals_views():
+            total_sheet_weights = _fetch_query(
+                """
+                SELECT setcode, sheetname, boostername, total_weight FROM set_sheet_totals
+                WHERE set_sheet_totals.setcode = ANY(%s)
+                """,
+                [missing],
+            )
+        else:
+            total_sheet_weights = _fetch_query(
+                """
+                SELECT setboostersheetcards.setcode, setboostersheetcards.sheetname, setboostersheetcards.boostername, SUM(cardweight) as total_weight 
+                FROM setboostersheetcards 
+                WHERE setboostersheetcards.setcode = ANY(%s)
+                GROUP BY setboostersheetcards.setcode, setboostersheetcards.sheetname, setboostersheetcards.boostername
+                """,
+                [missing],
+            )
+
+        fetched = {set_code: {} for set_code in missing}
+        for weight_row in total_sheet_weights:
+            fetched[weight_row[0]][(weight_row[1], weight_row[2])] = weight_row[3]
+
+        for set_code, entry in fetched.items():
+            sheet_totals_cache.put(set_code, entry)
+        found.update(fetched)
+
+    return {
+        (set_code, sheet_name, booster_name): total
+        for set_code, entry in found.items()
+        for (sheet_name, booster_name), total in entry.items()
+    }
+
+
 def fetch_boosters(set_code: str, uuid: str):
     """
     Fetches booster types and their respective weights.
     """
+    return fetch_deck_boosters({uuid: set_code}).get(uuid, {})
 
-    total_booster_weight = _fetch_query(
-        """
-        SELECT boostername, SUM(boosterweight) as total_booster_weight FROM setboostercontentweights WHERE setboostercontentweights.setcode = %s
-        GROUP BY boostername
-        """,
-        [set_code],
-    )
 
-    booster_join = _fetch_query(
-        """
-        SELECT sbsc.*, sbc.boosterindex, sheetpicks, boosterweight
-        FROM public.setboostersheetcards as sbsc
-        LEFT JOIN setboostercontents as sbc
-            ON sbc.setcode = sbsc.setcode 
-                AND sbc.sheetname = sbsc.sheetname
-                AND sbc.boostername = sbsc.boostername
-        LEFT JOIN setboostercontentweights as sbcw
-            ON sbcw.setcode = sbsc.setcode 
-                AND sbcw.boostername = sbsc.boostername
-                AND sbcw.boosterindex = sbc.boosterindex
-        WHERE carduuid = %s AND sbsc.setcode = %s
-        """,
-        [uuid, set_code],
-    )
+def fetch_deck_boosters(card_sets: Dict[str, str]) -> Dict[str, Dict]:
+    """
+    Fetches booster types and their respective weights for many printings at once.
+    card_sets maps card uuids to their set code, the result maps card uuids to the same booster Dict
+    fetch_boosters returns.
+    """
+    if not card_sets:
+        return {}
+
+    set_codes = sorted(set(card_sets.values()))
+
+    total_weight_lookup = fetch_booster_totals(set_codes)
+
+    if snapshot is not None:
+        booster_join = snapshot.booster_rows(list(card_sets), set_codes)
+    else:
+        booster_join = _fetch_query(
+            """
+            SELECT sbsc.*, sbc.boosterindex, sheetpicks, boosterweight
+            FROM public.setboostersheetcards as sbsc
+            LEFT JOIN setboostercontents as sbc
+                ON sbc.setcode = sbsc.setcode 
+                    AND sbc.sheetname = sbsc.sheetname
+                    AND sbc.boostername = sbsc.boostername
+            LEFT JOIN setboostercontentweights as sbcw
+                ON sbcw.setcode = sbsc.setcode 
+                    AND sbcw.boostername = sbsc.boostername
+                    AND sbcw.boosterindex = sbc.boosterindex
+            WHERE carduuid = ANY(%s) AND sbsc.setcode = ANY(%s)
+            """,
+            [list(card_sets), set_codes],
+        )
+
+    booster_rows = {}
+    for booster in booster_join:
+        # Sheets can list printings of other sets, only keep the rows of the printing's own set.
+        if card_sets.get(booster[2]) == booster[4]:
+            booster_rows.setdefault(booster[2], []).append(booster)
 
-    total_weight_lookup = {
-        weight_row[0]: weight_row[1] for weight_row in total_booster_weight
+    return {
+        uuid: _build_boosters(rows, total_weight_lookup)
+        for uuid, rows in booster_rows.items()
     }
 
+
+def _build_boosters(booster_join, total_weight_lookup: Dict) -> Dict:
+    """
+    Groups the booster rows of a single printing by booster name.
+    """
     booster_dict = {}
 
     for booster in booster_join:
         booster_index = booster[6]
         booster_name = booster[1]
+        set_code = booster[4]
+
+        total_weight = total_weight_lookup.get((set_code, booster_name), None)
 
-        total_weight = total_weight_lookup.get(booster_name, None)
-        
         booster_pack = BoosterPack(
-            set_code=booster[3],
+            set_code=set_code,
             booster_name=booster_name,
             booster_index=booster_index,
             sheet_name=booster[5],
@@ -224,43 +951,110 @@ def fetch_sheetcards(set_code: str, uuid: str):
     """
     Fetches card weight on sheet and the respective total sheet weight.
     """
-    card_weights = _fetch_query(
-        """
-        SELECT * FROM setboostersheetcards WHERE setboostersheetcards.setcode = %s AND setboostersheetcards.carduuid = %s
-        """,
-        [set_code, uuid],
-    )
+    return fetch_deck_sheetcards({uuid: set_code}).get(uuid, {})
 
-    total_sheet_weights = _fetch_query(
-        """
-        SELECT setboostersheetcards.sheetname, setboostersheetcards.boostername, SUM(cardweight) as total_weight 
-        FROM setboostersheetcards 
-        WHERE setboostersheetcards.setcode = %s 
-        GROUP BY setboostersheetcards.sheetname, setboostersheetcards.boostername
-        """,
-        [set_code],
-    )
 
-    weight_lookup = {
-        (weight_row[0], weight_row[1]): weight_row[2]
-        for weight_row in total_sheet_weights
+def fetch_deck_sheetcards(card_sets: Dict[str, str]) -> Dict[str, Dict]:
+    """
+    Fetches card weights on sheets and the respective total sheet weights for many printings at once.
+    card_sets maps card uuids to their set code, the result maps card uuids to the same sheet Dict
+    fetch_sheetcards returns.
+    """
+    if not card_sets:
+        return {}
+
+    set_codes = sorted(set(card_sets.values()))
+
+    if snapshot is not None:
+        card_weights = snapshot.sheet_rows(list(card_sets), set_codes)
+    else:
+        card_weights = _fetch_query(
+            """
+            SELECT * FROM setboostersheetcards
+            WHERE setboostersheetcards.setcode = ANY(%s) AND setboostersheetcards.carduuid = ANY(%s)
+            """,
+            [set_codes, list(card_sets)],
+        )
+
+    weight_lookup = fetch_sheet_totals(set_codes)
+    foil_lookup = fetch_sheet_foils(set_codes)
+
+    sheet_rows = {}
+    for card in card_weights:
+        if card_sets.get(card[2]) == card[4]:
+            sheet_rows.setdefault(card[2], []).append(card)
+
+    return {
+        uuid: _build_sheetcards(rows, weight_lookup, foil_lookup)
+        for uuid, rows in sheet_rows.items()
     }
 
+
+def fetch_sheet_foils(set_codes: List[str]) -> Dict[Tuple[str, str, str], Optional[bool]]:
+    """
+    Fetches the sheetisfoil flag of setboostersheets per set, sheet and booster name, only querying sets that are
+    not cached yet. Empty when the database or snapshot has no setboostersheets.
+    """
+    global booster_sheets_available
+
+    found, missing = sheet_foils_cache.get_many(set_codes)
+
+    if missing:
+        if snapshot is not None:
+            sheet_rows = snapshot.sheet_foil_rows(missing)
+        else:
+            if booster_sheets_available is None:
+                rows = _fetch_query("SELECT to_regclass('setboostersheets') IS NOT NULL")
+                booster_sheets_available = bool(rows[0][0])
+            sheet_rows = (
+                _fetch_query(
+                    """
+                    SELECT setcode, sheetname, boostername, sheetisfoil FROM setboostersheets
+                    WHERE setboostersheets.setcode = ANY(%s)
+                    """,
+                    [missing],
+                )
+                if booster_sheets_available
+                else []
+            )
+
+        fetched = {set_code: {} for set_code in missing}
+        for set_code, sheet_name, booster_name, sheet_is_foil in sheet_rows:
+            fetched[set_code][(sheet_name, booster_name)] = sheet_is_foil
+
+        for set_code, entry in fetched.items():
+            sheet_foils_cache.put(set_code, entry)
+        found.update(fetched)
+
+    return {
+        (set_code, sheet_name, booster_name): sheet_is_foil
+        for set_code, entry in found.items()
+        for (sheet_name, booster_name), sheet_is_foil in entry.items()
+    }
+
+
+def _build_sheetcards(card_weights, weight_lookup: Dict, foil_lookup: Optional[Dict] = None) -> Dict:
+    """
+    Keys the sheet rows of a single printing by booster and sheet name.
+    """
     sheet_dict = {}
 
     for card in card_weights:
         sheet_name = card[5]
         booster_name = card[1]
+        set_code = card[4]
 
-        weight = weight_lookup.get((sheet_name, booster_name), None)
+        weight = weight_lookup.get((set_code, sheet_name, booster_name), None)
+        sheet_is_foil = (foil_lookup or {}).get((set_code, sheet_name, booster_name))
 
         sheet_card = SheetCard(
-            set_code=card[4],
+            set_code=set_code,
             booster_name=booster_name,
             sheet_name=sheet_name,
             card_uuid=card[2],
             card_weight=card[3],
             sheet_weight=weight,
+            sheet_is_foil=sheet_is_foil,
         )
 
         sheet_dict[(sheet_card.booster_name, sheet_card.sheet_name)] = sheet_card
@@ -290,32 +1084,220 @@ def fetch_cardstats(uuid: str, boosters, sheet):
 
     return cardweight_list
 
-def CalculateDropChance(card: CardSet):
+# Finishes in the order of the Finish codes of _drop_chance_arrays.
+SHEET_FINISHES = ["nonfoil", "foil", "etched"]
+
+
+def _sheet_finish(sheet_name: str, sheet_is_foil: Optional[bool] = None) -> int:
+    """
+    The finish a sheet hands out, as an index into SHEET_FINISHES. MTGJSON flags foil sheets with sheetIsFoil
+    but has no flag for etched sheets, which are named like "etchedRareMythic". Without the flag foil sheets are
+    told apart by their names, like "foil" or "rareMythicFoil".
+    """
+    sheet_name = sheet_name.lower()
+    if "etched" in sheet_name:
+        return 2
+    if sheet_is_foil is not None:
+        return 1 if sheet_is_foil else 0
+    return 1 if "foil" in sheet_name and "nonfoil" not in sheet_name else 0
+
+
+def _drop_chance_arrays(cards: List[CardSet]) -> Dict:
+    """
+    Joins the BoosterPack rows of every printing onto its SheetCard rows by booster and sheet name and
+    flattens the result into arrays, one entry per (printing, booster index, sheet) combination.
+    Printing and Set hold the group index of every entry, PrintingKeys and SetKeys the matching keys,
+    Finish the finish of the entry's sheet.
+    """
+    printing_groups = {}
+    set_groups = {}
+    printing_index = []
+    set_index = []
+    booster_weight_ratios = []
+    sheet_picks = []
+    card_weights = []
+    sheet_weights = []
+    finishes = []
+
+    for card in cards:
+        for booster_name, booster_details in card.boosters.items():
+            printing_group = printing_groups.setdefault(
+                (card.uuid, booster_name), len(printing_groups)
+            )
+            set_group = set_groups.setdefault(
+                (card.set_code, booster_name), len(set_groups)
+            )
+            for booster_pack in booster_details["BoosterPacks"]:
+                sheet_card = card.sheet_cards.get((booster_name, booster_pack.sheet_name))
+                if sheet_card is None:
+                    continue
+
+                printing_index.append(printing_group)
+                set_index.append(set_group)
+                booster_weight_ratios.append(booster_pack.booster_weight_ratio)
+                sheet_picks.append(booster_pack.sheet_picks)
+                card_weights.append(sheet_card.card_weight)
+                sheet_weights.append(sheet_card.sheet_weight)
+                finishes.append(_sheet_finish(booster_pack.sheet_name, sheet_card.sheet_is_foil))
+
+    return {
+        "Printing": np.array(printing_index, dtype=np.intp),
+        "Set": np.array(set_index, dtype=np.intp),
+        "PrintingKeys": list(printing_groups),
+        "SetKeys": list(set_groups),
+        "BoosterWeightRatio": np.array(booster_weight_ratios, dtype=float),
+        "SheetPicks": np.array(sheet_picks, dtype=float),
+        "CardWeight": np.array(card_weights, dtype=float),
+        "SheetWeight": np.array(sheet_weights, dtype=float),
+        "Finish": np.array(finishes, dtype=np.intp),
+    }
+
+
+def _drop_chances(arrays: Dict) -> np.ndarray:
     """
     (Booster (Type) Weight / Total Booster (Types) Weight) * Sheet Pick * (Card (on sheet) Weight / Total Sheet Weight)
-    Sheet name from BoosterPack needs to be the same as sheet name from SheetCard.
-    Join SheetCard onto BoosterPack where SheetCard.Sheetname = BoosterPack.Sheetname
-    options:
-        - look to see if I can do a join in PSQL
-        - join them as dictionaries in Python
+    for every entry of _drop_chance_arrays. Missing weights count as a chance of 0.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chances = (
+            arrays["BoosterWeightRatio"]
+            * arrays["SheetPicks"]
+            * (arrays["CardWeight"] / arrays["SheetWeight"])
+        )
+    return np.nan_to_num(chances, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def CalculateDropChance(cards: List[CardSet]) -> Dict:
+    """
+    Calculates the drop chance of every printing in cards as
+    (Booster (Type) Weight / Total Booster (Types) Weight) * Sheet Pick * (Card (on sheet) Weight / Total Sheet Weight),
+    joining SheetCard onto BoosterPack where SheetCard.sheet_name = BoosterPack.sheet_name.
+    The chance is the expected number of copies opened per booster of that type, summed over the booster
+    variants and sheets. Returns a Dict with
+        - Printings: (uuid, booster name) -> expected copies of the printing per booster
+        - Sets: (set code, booster name) -> expected copies of any of the given printings per booster
+    """
+    arrays = _drop_chance_arrays(cards)
+    chances = _drop_chances(arrays)
+
+    printing_chances = np.bincount(
+        arrays["Printing"], weights=chances, minlength=len(arrays["PrintingKeys"])
+    )
+    set_chances = np.bincount(
+        arrays["Set"], weights=chances, minlength=len(arrays["SetKeys"])
+    )
+
+    return {
+        "Printings": dict(zip(arrays["PrintingKeys"], printing_chances.tolist())),
+        "Sets": dict(zip(arrays["SetKeys"], set_chances.tolist())),
+    }
+
+
+def CalculateExpectedValue(cards: List[CardSet], prices: Dict[Tuple[str, str], float]) -> Dict:
+    """
+    Calculates the expected value of the given printings per booster: the drop chance of every
+    (printing, booster index, sheet) entry of CalculateDropChance times the price of the printing in the
+    sheet's finish, prices is keyed by (uuid, finish) as prices.load_prices returns it. Unpriced printings
+    count as 0. Returns a Dict with
+        - Sets: (set code, booster name) -> expected value per booster
+        - Ranking: the Sets keys with their ExpectedValue, highest first
+        - Unpriced: uuids of printings that can be opened but have no price for the finish they drop in
     """
-    pass
+    arrays = _drop_chance_arrays(cards)
+    chances = _drop_chances(arrays)
+
+    uuids = [uuid for uuid, _ in arrays["PrintingKeys"]]
+    price_table = np.array(
+        [[prices.get((uuid, finish), np.nan) for finish in SHEET_FINISHES] for uuid in uuids],
+        dtype=float,
+    ).reshape(len(uuids), len(SHEET_FINISHES))
+    entry_prices = price_table[arrays["Printing"], arrays["Finish"]]
+
+    unpriced = np.isnan(entry_prices) & (chances > 0)
+    values = chances * np.nan_to_num(entry_prices, nan=0.0)
+    set_values = np.bincount(arrays["Set"], weights=values, minlength=len(arrays["SetKeys"]))
+
+    order = np.argsort(-set_values, kind="stable")
+    return {
+        "Sets": dict(zip(arrays["SetKeys"], set_values.tolist())),
+        "Ranking": [
+            {
+                "Set": arrays["SetKeys"][index][0],
+                "Booster": arrays["SetKeys"][index][1],
+                "ExpectedValue": float(set_values[index]),
+            }
+            for index in order
+        ],
+        "Unpriced": sorted({uuids[index] for index in arrays["Printing"][unpriced]}),
+    }
+
+
+def main(
+    file_path,
+    workers: int = 1,
+    exact: Optional[bool] = None,
+    simulate: int = 0,
+    seed: Optional[int] = None,
+    query_stats: bool = False,
+    store: Optional[DeckStore] = None,
+    fuzzy: bool = False,
+    card_filter: Optional[CardFilter] = None,
+    prices: Optional[Dict[Tuple[str, str], float]] = None,
+):
+    # Lands are never worth opening boosters for, the filter runs in the printing query.
+    land_filter = ~Has("types", "Land")
+    card_filter = land_filter if card_filter is None else land_filter & card_filter
+
+    if workers > POOL_MAX_CONNECTIONS:
+        configure_pool(workers)
 
-def main(file_path):
     deck_data = read_deck(file_path)
+    if fuzzy:
+        deck_data, corrections = resolve_deck(deck_data, load_name_resolver())
+        for match in corrections:
+            if match.name:
+                my_logger.info(
+                    f"Resolved '{match.query}' to '{match.name}' (confidence {match.confidence:.2f})"
+                )
+            else:
+                my_logger.warning(
+                    f"Could not resolve '{match.query}' (best confidence {match.confidence:.2f})"
+                )
     set_counts = {}
+    if store is not None:
+        deck_copies = fetch_deck_copies_incremental(file_path, store, deck_data)
+    else:
+        deck_copies = fetch_deck_copies(
+            [card_name for _, card_name in deck_data],
+            workers=workers,
+            card_filter=card_filter,
+        )
+    copies = None
     for card in deck_data:
         _, card_name = card
-        copies = fetch_copies(card_name)
-        filtered_copies = filter_cards(copies, {"Land"})
+        copies = deck_copies[card_name]
+        filtered_copies = filter_cards(copies, card_filter)
         count_sets(filtered_copies, set_counts)
 
-    sorted_set_counts = heapq.nlargest(
-        10, set_counts.items(), key=lambda item: item[1]["Count"]
-    )
+    # Release the filtered out printings so their booster data is never fetched.
+    del deck_copies, copies
+
+    recommendation = recommend_sets(set_counts, deck_data, exact=exact)
+    sorted_set_counts = [
+        (entry["Set"], set_counts[entry["Set"]]) for entry in recommendation["Sets"]
+    ]
+
+    top_cards = [card for _, value in sorted_set_counts for card in value["Cards"]]
+    resolve_booster_data(top_cards, workers=workers)
+    drop_chances = CalculateDropChance(top_cards)
+
+    my_logger.debug(f"Set totals cache: {set_totals_cache_info()}")
 
-    for set_code, value in sorted_set_counts:
-        print(f"{set_code}: {value['Count']}")
+    for entry, (set_code, value) in zip(recommendation["Sets"], sorted_set_counts):
+        print(f"{set_code}: {value['Count']} (covers {entry['Quantity']} more deck cards)")
+        for (chance_set_code, booster_name), chance in drop_chances["Sets"].items():
+            if chance_set_code == set_code:
+                print(f" ~ {booster_name}: {chance:.4f} deck cards per booster")
         for card in value.get("Cards", []):
             print(f" - {card.name} - {card.finishes} - {card.border_color}")
             print(f" - {card.uuid}")
@@ -335,5 +1317,134 @@ def main(file_path):
                     print(f"       - Booster Weight: {booster_pack.booster_weight} \n")
                     print(f"       - Booster Weight Ratio: {booster_pack.booster_weight_ratio} \n")
 
+    if recommendation["Uncovered"]:
+        print(f"Not held by any set: {', '.join(recommendation['Uncovered'])}")
+
+    if prices is not None:
+        # Every set holding deck cards is ranked, not only the recommended ones.
+        all_cards = [card for value in set_counts.values() for card in value["Cards"]]
+        resolve_booster_data(all_cards, workers=workers)
+        expected_values = CalculateExpectedValue(all_cards, prices)
+        print("Expected deck value per booster:")
+        for entry in expected_values["Ranking"]:
+            print(f" {entry['Set']} {entry['Booster']}: {entry['ExpectedValue']:.2f}")
+        if expected_values["Unpriced"]:
+            my_logger.warning(
+                f"{len(expected_values['Unpriced'])} printings have no price: "
+                f"{', '.join(expected_values['Unpriced'][:10])}"
+            )
+
+    if simulate:
+        simulations = simulate_sets(
+            set_counts,
+            [set_code for set_code, _ in sorted_set_counts],
+            deck_data,
+            boosters=simulate,
+            seed=seed,
+        )
+        for (set_code, booster_name), simulation in simulations.items():
+            to_complete = simulation["BoostersToComplete"]
+            print(f"{set_code} {booster_name}: {simulation['Boosters']} simulated boosters")
+            print(f" - Distinct deck cards per booster: {simulation['CardsPerBooster']}")
+            print(
+                f" - Boosters to complete: mean {to_complete['Mean']}, median {to_complete['Median']}, "
+                f"p90 {to_complete['P90']}, incomplete runs {to_complete['Incomplete']}"
+            )
+
+    if query_stats:
+        print("Query statistics:")
+        print(instrumentation.format_summary(instrumentation.query_stats.summary()))
+
 if __name__ == "__main__":
-    main("example_deck.txt")
+    parser = argparse.ArgumentParser(description="Finds the sets that hold most of a deck.")
+    parser.add_argument("deck_file", nargs="?", default="example_deck.txt")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of parallel database lookups, keep it below the database connection limit",
+    )
+    parser.add_argument(
+        "--snapshot",
+        help="read from a snapshot directory written by snapshot.py instead of the database",
+    )
+    parser.add_argument(
+        "--exact",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="force or disable the exact set cover search, by default it is used for small decks",
+    )
+    parser.add_argument(
+        "--simulate",
+        type=int,
+        default=0,
+        metavar="BOOSTERS",
+        help="open this many simulated boosters per recommended set and booster type",
+    )
+    parser.add_argument("--seed", type=int, help="seed for the booster simulation")
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="print the latency, pool wait and rows of every query shape after the run",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve the query histograms in the Prometheus text format on this port during the run",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=["cprofile", "sample"],
+        default=os.getenv("SETCHECKER_PROFILE") or None,
+        help="profile the run, defaults to the SETCHECKER_PROFILE environment variable",
+    )
+    parser.add_argument(
+        "--profile-output",
+        default=os.getenv("SETCHECKER_PROFILE_OUTPUT") or None,
+        help="file for the profile (pstats for cprofile, text for sample), defaults to stderr",
+    )
+    parser.add_argument(
+        "--store",
+        nargs="?",
+        const=DEFAULT_STORE_PATH,
+        help="keep the deck's printings in this sqlite file and only fetch the cards changed since the last run",
+    )
+    parser.add_argument(
+        "--fuzzy",
+        action="store_true",
+        help="resolve misspelled, unaccented or single face card names to their canonical names",
+    )
+    parser.add_argument(
+        "--filter",
+        action="append",
+        default=[],
+        metavar="FIELD=VALUE",
+        help="only consider printings matching field=value[,value] or not matching field!=value, "
+        "like language=English or availability=paper, repeat to combine",
+    )
+    parser.add_argument(
+        "--prices",
+        help="CSV or JSON price table keyed by uuid and finish, ranks every set by expected deck value per booster",
+    )
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        instrumentation.serve_metrics(args.metrics_port)
+
+    use_snapshot(args.snapshot)
+    with (
+        DeckStore(args.store) if args.store else nullcontext() as store,
+        instrumentation.profiled(args.profile, args.profile_output),
+    ):
+        main(
+            args.deck_file,
+            workers=args.workers,
+            exact=args.exact,
+            simulate=args.simulate,
+            seed=args.seed,
+            query_stats=args.stats,
+            store=store,
+            fuzzy=args.fuzzy,
+            card_filter=parse_filters(args.filter),
+            prices=load_prices(args.prices) if args.prices else None,
+        )
@@ -0,0 +1,193 @@
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+# Decks up to this many distinct cards are solved exactly unless told otherwise.
+EXACT_CARD_LIMIT = 64
+
+# Upper bound on branch and bound nodes, the best cover found so far is returned when it is reached.
+EXACT_NODE_LIMIT = 50_000
+
+
+def _deck_quantities(deck_data: List[Tuple[int, str]]) -> Dict[str, int]:
+    quantities = {}
+    for count, card_name in deck_data:
+        quantities[card_name] = quantities.get(card_name, 0) + count
+    return quantities
+
+
+def _set_masks(set_counts: Dict, card_index: Dict[str, int]) -> Dict[str, int]:
+    """
+    Represents the deck cards each set holds as a bitset, bit i is set when the set holds deck card i.
+    """
+    masks = {}
+    for set_code, value in set_counts.items():
+        mask = 0
+        for card in value["Cards"]:
+            if card.name in card_index:
+                mask |= 1 << card_index[card.name]
+        if mask:
+            masks[set_code] = mask
+    return masks
+
+
+def _quantity_classes(quantities: List[int]) -> List[Tuple[int, int]]:
+    """
+    Groups the deck cards by quantity, so a weighted coverage is a handful of popcounts.
+    """
+    classes = {}
+    for index, quantity in enumerate(quantities):
+        classes[quantity] = classes.get(quantity, 0) | (1 << index)
+    return list(classes.items())
+
+
+def _weight(mask: int, classes: List[Tuple[int, int]]) -> int:
+    return sum(quantity * (mask & class_mask).bit_count() for quantity, class_mask in classes)
+
+
+def greedy_cover(masks: Dict[str, int], universe: int, classes: List[Tuple[int, int]]) -> List[str]:
+    """
+    Greedy weighted set cover, picks the set covering the largest quantity of uncovered deck cards until
+    everything coverable is covered. Coverage only shrinks, so stale heap entries are re-scored lazily.
+    """
+    heap = [(-_weight(mask, classes), set_code) for set_code, mask in masks.items()]
+    heapq.heapify(heap)
+
+    uncovered = universe
+    chosen = []
+    while uncovered and heap:
+        _, set_code = heapq.heappop(heap)
+        score = _weight(masks[set_code] & uncovered, classes)
+        if not score:
+            continue
+        if heap and -heap[0][0] > score:
+            heapq.heappush(heap, (-score, set_code))
+            continue
+        chosen.append(set_code)
+        uncovered &= ~masks[set_code]
+
+    return chosen
+
+
+def exact_cover(
+    masks: Dict[str, int],
+    universe: int,
+    classes: List[Tuple[int, int]],
+    node_limit: int = EXACT_NODE_LIMIT,
+) -> List[str]:
+    """
+    Branch and bound for the smallest number of sets covering everything coverable, seeded with the
+    greedy cover. Branches on the uncovered card held by the fewest sets.
+    """
+    best = greedy_cover(masks, universe, classes)
+
+    # Drop sets whose cards are a subset of another set's cards, they are never needed.
+    ordered = sorted(masks.items(), key=lambda item: (-item[1].bit_count(), item[0]))
+    kept = []
+    for set_code, mask in ordered:
+        if not any(mask & ~other == 0 for _, other in kept):
+            kept.append((set_code, mask))
+
+    card_sets = {}
+    for set_code, mask in kept:
+        remaining = mask
+        while remaining:
+            bit = remaining & -remaining
+            card_sets.setdefault(bit, []).append((set_code, mask))
+            remaining ^= bit
+
+    largest_cover = {
+        bit: max(mask.bit_count() for _, mask in sets) for bit, sets in card_sets.items()
+    }
+    nodes = 0
+
+    def search(uncovered: int, chosen: List[str]):
+        nonlocal best, nodes
+
+        if not uncovered:
+            if len(chosen) < len(best):
+                best = list(chosen)
+            return
+
+        nodes += 1
+        if nodes > node_limit:
+            return
+
+        remaining = uncovered
+        branch_sets = None
+        largest = 0
+        while remaining:
+            bit = remaining & -remaining
+            sets = card_sets[bit]
+            if branch_sets is None or len(sets) < len(branch_sets):
+                branch_sets = sets
+            largest = max(largest, largest_cover[bit])
+            remaining ^= bit
+
+        # Every set covers at most `largest` of the uncovered cards, which bounds the sets still needed.
+        if len(chosen) + -(-uncovered.bit_count() // largest) >= len(best):
+            return
+
+        for set_code, mask in sorted(
+            branch_sets, key=lambda item: -_weight(item[1] & uncovered, classes)
+        ):
+            chosen.append(set_code)
+            search(uncovered & ~mask, chosen)
+            chosen.pop()
+
+    search(universe, [])
+    return best
+
+
+def recommend_sets(
+    set_counts: Dict, deck_data: List[Tuple[int, str]], exact: Optional[bool] = None
+) -> Dict:
+    """
+    Recommends the smallest group of sets that together hold every deck card found in set_counts.
+    set_counts is the output of count_sets, deck_data the output of read_deck whose card quantities weight
+    the greedy choice. exact forces or disables branch and bound, by default it is used for small decks.
+    Returns a Dict with
+        - Sets: the chosen sets in pick order, each a Dict with Set, Cards (newly covered card names) and Quantity
+        - Uncovered: the deck cards none of the sets hold
+    """
+    quantities = _deck_quantities(deck_data)
+    card_names = list(quantities)
+    card_index = {card_name: index for index, card_name in enumerate(card_names)}
+    classes = _quantity_classes([quantities[card_name] for card_name in card_names])
+
+    masks = _set_masks(set_counts, card_index)
+    universe = 0
+    for mask in masks.values():
+        universe |= mask
+
+    if exact is None:
+        exact = len(card_names) <= EXACT_CARD_LIMIT
+
+    chosen = (
+        exact_cover(masks, universe, classes)
+        if exact
+        else greedy_cover(masks, universe, classes)
+    )
+
+    # Order the picks by the quantity they add, so the most useful set comes first.
+    recommendations = []
+    uncovered = universe
+    remaining = list(chosen)
+    while remaining:
+        set_code = max(remaining, key=lambda code: (_weight(masks[code] & uncovered, classes), code))
+        remaining.remove(set_code)
+        added = masks[set_code] & uncovered
+        uncovered &= ~added
+        recommendations.append(
+            {
+                "Set": set_code,
+                "Cards": [card_names[i] for i in range(len(card_names)) if added >> i & 1],
+                "Quantity": _weight(added, classes),
+            }
+        )
+
+    return {
+        "Sets": recommendations,
+        "Uncovered": [
+            card_name for card_name in card_names if not universe >> card_index[card_name] & 1
+        ],
+    }
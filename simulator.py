@@ -0,0 +1,217 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from schemas import CardSet
+
+# Boosters sampled per batch, bounds the memory of a simulation independent of its size.
+BATCH_SIZE = 100_000
+
+
+class BoosterModel:
+    """
+    The part of a booster type that matters for a deck: the booster variants (booster indexes) holding a sheet
+    with deck cards, and per sheet the chance that a pick is each of the deck cards.
+    Built from the BoosterPack and SheetCard data of the deck's printings in one set.
+    """
+
+    def __init__(self, cards: List[CardSet], booster_name: str):
+        self.card_names = list(dict.fromkeys(card.name for card in cards))
+        card_index = {card_name: index for index, card_name in enumerate(self.card_names)}
+
+        variants = {}
+        sheets = {}
+        for card in cards:
+            booster_details = card.boosters.get(booster_name)
+            if not booster_details:
+                continue
+            for booster_pack in booster_details["BoosterPacks"]:
+                sheet_card = card.sheet_cards.get((booster_name, booster_pack.sheet_name))
+                if (
+                    sheet_card is None
+                    or not booster_pack.booster_weight_ratio
+                    or not sheet_card.sheet_weight
+                ):
+                    continue
+
+                variants[booster_pack.booster_index] = booster_pack.booster_weight_ratio
+                sheet = sheets.setdefault(
+                    (booster_pack.booster_index, booster_pack.sheet_name),
+                    {"Picks": int(booster_pack.sheet_picks), "Cards": {}},
+                )
+                # Different printings of a deck card on one sheet all count as that deck card.
+                index = card_index[card.name]
+                sheet["Cards"][index] = (
+                    sheet["Cards"].get(index, 0.0)
+                    + sheet_card.card_weight / sheet_card.sheet_weight
+                )
+
+        self.variant_indexes = list(variants)
+        # The last outcome stands for the variants without any deck card sheet.
+        ratios = np.array([variants[index] for index in self.variant_indexes], dtype=float)
+        self.variant_chances = np.append(ratios, max(0.0, 1.0 - ratios.sum()))
+        self.variant_chances /= self.variant_chances.sum()
+
+        self.sheets = []
+        for (booster_index, _), sheet in sheets.items():
+            indexes = np.array(list(sheet["Cards"]), dtype=np.intp)
+            chances = np.array(list(sheet["Cards"].values()), dtype=float)
+            self.sheets.append(
+                (
+                    self.variant_indexes.index(booster_index),
+                    sheet["Picks"],
+                    indexes,
+                    np.append(chances, max(0.0, 1.0 - chances.sum())),
+                )
+            )
+
+    def open(self, rng: np.random.Generator, boosters: int) -> np.ndarray:
+        """
+        Opens boosters at once and returns the copies of each deck card per booster, shape (boosters, cards).
+        Picks are drawn with replacement, so a sheet can hand out the same card twice in one booster.
+        """
+        obtained = np.zeros((boosters, len(self.card_names)), dtype=np.int32)
+        variants = rng.choice(len(self.variant_chances), size=boosters, p=self.variant_chances)
+
+        for variant, picks, indexes, chances in self.sheets:
+            rows = np.flatnonzero(variants == variant)
+            if not len(rows):
+                continue
+            counts = rng.multinomial(picks, chances / chances.sum(), size=len(rows))
+            obtained[np.ix_(rows, indexes)] += counts[:, :-1]
+
+        return obtained
+
+
+def simulate_boosters(
+    cards: List[CardSet],
+    booster_name: str,
+    boosters: int = 1_000_000,
+    quantities: Optional[Dict[str, int]] = None,
+    trials: int = 1_000,
+    max_boosters: int = 10_000,
+    seed: Optional[int] = None,
+) -> Dict:
+    """
+    Opens virtual boosters of one set and booster type for the deck printings in cards.
+    quantities holds the copies needed per card name, 1 each by default. Returns a Dict with
+        - CardsPerBooster: how many boosters held 0, 1, 2, ... distinct deck cards
+        - ExpectedCopies: card name -> average copies per booster
+        - BoostersToComplete: Mean, Median and P90 of boosters opened until every obtainable card has its
+          quantity, over `trials` runs capped at max_boosters, plus how many runs did not Complete
+        - Unobtainable: deck cards this booster type can not hold
+    """
+    rng = np.random.default_rng(seed)
+    model = BoosterModel(cards, booster_name)
+    card_count = len(model.card_names)
+
+    histogram = np.zeros(card_count + 1, dtype=np.int64)
+    copies = np.zeros(card_count, dtype=np.int64)
+    for start in range(0, boosters, BATCH_SIZE):
+        obtained = model.open(rng, min(BATCH_SIZE, boosters - start))
+        histogram += np.bincount((obtained > 0).sum(axis=1), minlength=card_count + 1)
+        copies += obtained.sum(axis=0)
+
+    obtainable = np.zeros(card_count, dtype=bool)
+    for _, _, indexes, _ in model.sheets:
+        obtainable[indexes] = True
+
+    needed = np.array(
+        [(quantities or {}).get(card_name, 1) for card_name in model.card_names],
+        dtype=np.int64,
+    )
+    needed[~obtainable] = 0
+
+    return {
+        "Booster": booster_name,
+        "Boosters": boosters,
+        "CardsPerBooster": histogram.tolist(),
+        "ExpectedCopies": dict(
+            zip(model.card_names, (copies / max(boosters, 1)).tolist())
+        ),
+        "BoostersToComplete": _boosters_to_complete(
+            model, rng, needed, trials, max_boosters
+        ),
+        "Unobtainable": [
+            card_name
+            for card_name, can_obtain in zip(model.card_names, obtainable)
+            if not can_obtain
+        ],
+    }
+
+
+def _boosters_to_complete(
+    model: BoosterModel,
+    rng: np.random.Generator,
+    needed: np.ndarray,
+    trials: int,
+    max_boosters: int,
+) -> Dict:
+    """
+    Runs all trials side by side, opening a block of boosters per trial per step, and finds the booster
+    at which each trial first holds the needed copies with a cumulative sum over the block.
+    """
+    if not needed.any() or not trials:
+        return {"Mean": 0.0, "Median": 0.0, "P90": 0.0, "Incomplete": 0}
+
+    block = max(1, min(256, BATCH_SIZE // trials))
+    completed_at = np.full(trials, -1, dtype=np.int64)
+    collected = np.zeros((trials, len(needed)), dtype=np.int64)
+    opened = 0
+
+    while opened < max_boosters:
+        active = np.flatnonzero(completed_at < 0)
+        if not len(active):
+            break
+
+        size = min(block, max_boosters - opened)
+        obtained = model.open(rng, len(active) * size).reshape(len(active), size, -1)
+        running = collected[active, None, :] + np.cumsum(obtained, axis=1)
+        done = (running >= needed).all(axis=2)
+
+        finished = done.any(axis=1)
+        completed_at[active[finished]] = opened + done[finished].argmax(axis=1) + 1
+        collected[active] = running[:, -1, :]
+        opened += size
+
+    complete = completed_at[completed_at >= 0]
+    if not len(complete):
+        return {"Mean": None, "Median": None, "P90": None, "Incomplete": trials}
+
+    return {
+        "Mean": float(complete.mean()),
+        "Median": float(np.median(complete)),
+        "P90": float(np.percentile(complete, 90)),
+        "Incomplete": int(trials - len(complete)),
+    }
+
+
+def simulate_sets(
+    set_counts: Dict,
+    set_codes: List[str],
+    deck_data: List[Tuple[int, str]],
+    boosters: int = 1_000_000,
+    seed: Optional[int] = None,
+) -> Dict[Tuple[str, str], Dict]:
+    """
+    Runs simulate_boosters for every booster type of the given sets in set_counts (the output of count_sets),
+    using the deck quantities of read_deck. Returns a Dict keyed by (set code, booster name).
+    """
+    quantities = {}
+    for count, card_name in deck_data:
+        quantities[card_name] = quantities.get(card_name, 0) + count
+
+    rng = np.random.default_rng(seed)
+    results = {}
+    for set_code in set_codes:
+        cards = set_counts[set_code]["Cards"]
+        booster_names = sorted({name for card in cards for name in card.boosters})
+        for booster_name in booster_names:
+            results[(set_code, booster_name)] = simulate_boosters(
+                cards,
+                booster_name,
+                boosters=boosters,
+                quantities=quantities,
+                seed=int(rng.integers(2**32)),
+            )
+    return results
@@ -0,0 +1,414 @@
+import argparse
+import hashlib
+import json
+import numbers
+import os
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SNAPSHOT_FORMAT = 1
+
+# Columns exported per table, the setboostersheetcards columns keep the order of setboostersheetcards.*
+SHEET_CARD_COLUMNS = ["boostername", "carduuid", "cardweight", "setcode", "sheetname"]
+BOOSTER_CONTENT_COLUMNS = ["boostername", "boosterindex", "setcode", "sheetname", "sheetpicks"]
+BOOSTER_WEIGHT_COLUMNS = ["boostername", "boosterindex", "boosterweight", "setcode"]
+BOOSTER_SHEET_COLUMNS = ["boostername", "setcode", "sheetisfoil", "sheetname"]
+
+
+def _key_hash(value: str) -> int:
+    """
+    Stable 64 bit hash used by the snapshot indexes, unlike hash() it does not change between processes.
+    """
+    return int.from_bytes(
+        hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+def _hash_keys(values) -> np.ndarray:
+    return np.fromiter((_key_hash(value) for value in values), dtype=np.uint64)
+
+
+def _write_column(directory: str, name: str, values: List) -> Dict:
+    """
+    Writes a column as .npy files and returns its manifest entry.
+    Numbers and booleans are stored as float64 with NaN for NULL, text as utf-8 bytes plus offsets.
+    """
+    non_null = [value for value in values if value is not None]
+
+    if all(isinstance(value, numbers.Number) for value in non_null):
+        if all(isinstance(value, bool) for value in non_null) and non_null:
+            kind = "bool"
+        elif all(
+            isinstance(value, int) or (isinstance(value, Decimal) and value == int(value))
+            for value in non_null
+        ):
+            kind = "int"
+        else:
+            kind = "float"
+        array = np.array(
+            [np.nan if value is None else float(value) for value in values],
+            dtype=np.float64,
+        )
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+        return {"kind": kind}
+
+    encoded = [b"" if value is None else str(value).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+    np.save(os.path.join(directory, f"{name}.data.npy"), data)
+    if len(non_null) != len(values):
+        np.save(
+            os.path.join(directory, f"{name}.null.npy"),
+            np.array([value is None for value in values], dtype=bool),
+        )
+    return {"kind": "text", "nullable": len(non_null) != len(values)}
+
+
+def _write_index(directory: str, name: str, values: List[str]):
+    """
+    Writes a hash index over a text column: the sorted key hashes and the matching row numbers.
+    """
+    hashes = _hash_keys(values)
+    order = np.argsort(hashes, kind="stable")
+    np.save(os.path.join(directory, f"{name}.index.hash.npy"), hashes[order])
+    np.save(os.path.join(directory, f"{name}.index.rows.npy"), order.astype(np.int64))
+
+
+def _write_table(path: str, table: str, columns: List[str], rows, indexes=()) -> Dict:
+    directory = os.path.join(path, table)
+    os.makedirs(directory, exist_ok=True)
+
+    column_values = list(zip(*rows)) if rows else [() for _ in columns]
+    manifest = {"rows": len(rows), "columns": {}, "indexes": list(indexes)}
+    for column, values in zip(columns, column_values):
+        manifest["columns"][column] = _write_column(directory, column, list(values))
+    for column in indexes:
+        _write_index(directory, column, list(column_values[columns.index(column)]))
+    return manifest
+
+
+class _Table:
+    """
+    Read only view on a snapshot table, the column files are memory mapped on first use.
+    """
+
+    def __init__(self, path: str, manifest: Dict):
+        self.path = path
+        self.rows = manifest["rows"]
+        self.columns = manifest["columns"]
+        self._arrays = {}
+
+    def _load(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            # A plain ndarray view on the memory map, indexing np.memmap itself is a lot slower.
+            self._arrays[name] = np.load(
+                os.path.join(self.path, f"{name}.npy"), mmap_mode="r"
+            ).view(np.ndarray)
+        return self._arrays[name]
+
+    def lookup(self, column: str, keys) -> np.ndarray:
+        """
+        Returns the sorted row numbers whose column value is one of keys.
+        """
+        hashes = self._load(f"{column}.index.hash")
+        rows = self._load(f"{column}.index.rows")
+        keys = set(keys)
+        key_hashes = _hash_keys(keys)
+        starts = np.searchsorted(hashes, key_hashes, side="left")
+        ends = np.searchsorted(hashes, key_hashes, side="right")
+        candidates = (
+            np.concatenate([rows[start:end] for start, end in zip(starts, ends)])
+            if len(key_hashes)
+            else np.empty(0, dtype=np.int64)
+        )
+        # Hashes can collide, so the candidates are checked against the actual values.
+        values = self.values(column, candidates)
+        return np.sort(
+            np.array(
+                [row for row, value in zip(candidates, values) if value in keys],
+                dtype=np.int64,
+            )
+        )
+
+    def values(self, column: str, rows=None) -> List:
+        if column not in self.columns:
+            raise ValueError(f"Column {column} is not part of the snapshot.")
+
+        if rows is None:
+            rows = np.arange(self.rows)
+        kind = self.columns[column]
+
+        if kind["kind"] != "text":
+            array = np.asarray(self._load(column)[rows])
+            values = array.tolist()
+            if kind["kind"] == "int":
+                values = [None if value != value else int(value) for value in values]
+            elif kind["kind"] == "bool":
+                values = [None if value != value else bool(value) for value in values]
+            else:
+                values = [None if value != value else value for value in values]
+            return values
+
+        rows = np.asarray(rows, dtype=np.int64)
+        offsets = self._load(f"{column}.offsets")
+        data = memoryview(self._load(f"{column}.data"))
+        starts = offsets[rows].tolist()
+        ends = offsets[rows + 1].tolist()
+        values = [str(data[start:end], "utf-8") for start, end in zip(starts, ends)]
+
+        if kind.get("nullable"):
+            null = self._load(f"{column}.null")[rows].tolist()
+            values = [None if is_null else value for value, is_null in zip(values, null)]
+        return values
+
+
+class Snapshot:
+    """
+    Local columnar copy of the MTGJSON tables setchecker queries, written by export_snapshot.
+    The row methods return rows in the same shape as the matching queries in setchecker.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "manifest.json"), "r") as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format in {path}.")
+
+        self.path = path
+        self.version = self.manifest.get("version")
+        self.tables = {
+            table: _Table(os.path.join(path, table), table_manifest)
+            for table, table_manifest in self.manifest["tables"].items()
+        }
+        self._contents = None
+        self._weights = None
+
+    def card_rows(self, card_names: List[str], columns: Dict[str, str]) -> List[Dict]:
+        cards = self.tables["cards"]
+        rows = cards.lookup("name", card_names)
+        values = {field: cards.values(column, rows) for field, column in columns.items()}
+        return [
+            {field: values[field][i] for field in columns} for i in range(len(rows))
+        ]
+
+    def card_names(self) -> List[tuple]:
+        """
+        Returns the distinct (name, face name) pairs of the cards, face names are None unless exported.
+        """
+        cards = self.tables["cards"]
+        names = cards.values("name")
+        face_names = (
+            cards.values("facename") if "facename" in cards.columns else [None] * len(names)
+        )
+        return list(dict.fromkeys(zip(names, face_names)))
+
+    def booster_total_rows(self, set_codes: List[str]) -> List[tuple]:
+        return self._set_rows("boostertotals", ["setcode", "boostername", "total"], set_codes)
+
+    def sheet_total_rows(self, set_codes: List[str]) -> List[tuple]:
+        return self._set_rows(
+            "sheettotals", ["setcode", "sheetname", "boostername", "total"], set_codes
+        )
+
+    def sheet_rows(self, uuids: List[str], set_codes: List[str]) -> List[tuple]:
+        """
+        Rows of setboostersheetcards for uuids in set_codes, shaped like setboostersheetcards.*
+        """
+        sheet_cards = self.tables["setboostersheetcards"]
+        rows = sheet_cards.lookup("carduuid", uuids)
+        values = [sheet_cards.values(column, rows) for column in SHEET_CARD_COLUMNS]
+        set_codes = set(set_codes)
+        return [
+            (int(row), *row_values)
+            for row, *row_values in zip(rows, *values)
+            if row_values[3] in set_codes
+        ]
+
+    def booster_rows(self, uuids: List[str], set_codes: List[str]) -> List[tuple]:
+        """
+        The sheet rows left joined onto setboostercontents and setboostercontentweights,
+        shaped like setboostersheetcards.*, boosterindex, sheetpicks, boosterweight.
+        """
+        contents, weights = self._booster_lookups()
+        booster_join = []
+        for sheet_row in self.sheet_rows(uuids, set_codes):
+            _, booster_name, _, _, set_code, sheet_name = sheet_row
+            matches = contents.get((set_code, sheet_name, booster_name))
+            if not matches:
+                booster_join.append((*sheet_row, None, None, None))
+                continue
+            for booster_index, sheet_picks in matches:
+                booster_weight = weights.get((set_code, booster_name, booster_index))
+                booster_join.append((*sheet_row, booster_index, sheet_picks, booster_weight))
+        return booster_join
+
+    def sheet_foil_rows(self, set_codes: List[str]) -> List[tuple]:
+        """
+        (setcode, sheetname, boostername, sheetisfoil) of the sheets of set_codes, empty for snapshots
+        written without setboostersheets.
+        """
+        if "setboostersheets" not in self.tables:
+            return []
+        return self._set_rows(
+            "setboostersheets", ["setcode", "sheetname", "boostername", "sheetisfoil"], set_codes
+        )
+
+    def _set_rows(self, table: str, columns: List[str], set_codes: List[str]) -> List[tuple]:
+        set_table = self.tables[table]
+        rows = set_table.lookup("setcode", set_codes)
+        return list(zip(*(set_table.values(column, rows) for column in columns)))
+
+    def _booster_lookups(self):
+        """
+        setboostercontents and setboostercontentweights are small, they are kept in memory as join lookups.
+        """
+        if self._contents is None:
+            contents = {}
+            content_table = self.tables["setboostercontents"]
+            for booster_name, booster_index, set_code, sheet_name, sheet_picks in zip(
+                *(content_table.values(column) for column in BOOSTER_CONTENT_COLUMNS)
+            ):
+                contents.setdefault((set_code, sheet_name, booster_name), []).append(
+                    (booster_index, sheet_picks)
+                )
+
+            weight_table = self.tables["setboostercontentweights"]
+            weights = {
+                (set_code, booster_name, booster_index): booster_weight
+                for booster_name, booster_index, booster_weight, set_code in zip(
+                    *(weight_table.values(column) for column in BOOSTER_WEIGHT_COLUMNS)
+                )
+            }
+            self._contents, self._weights = contents, weights
+
+        return self._contents, self._weights
+
+
+def _sum_by(rows, key_indexes: List[int], value_index: int) -> List[tuple]:
+    """
+    SUM(value) GROUP BY keys, NULL values are skipped like in SQL.
+    """
+    totals = {}
+    for row in rows:
+        key = tuple(row[index] for index in key_indexes)
+        value = row[value_index]
+        if value is not None:
+            totals[key] = totals.get(key, 0) + value
+        else:
+            totals.setdefault(key, None)
+    return [(*key, total) for key, total in totals.items()]
+
+
+def write_snapshot(
+    path: str,
+    card_columns: List[str],
+    card_rows,
+    sheet_rows,
+    content_rows,
+    weight_rows,
+    version: Optional[str] = None,
+    booster_sheet_rows=None,
+) -> Dict:
+    """
+    Writes a snapshot from table rows: cards rows hold card_columns, the other rows the columns of
+    SHEET_CARD_COLUMNS, BOOSTER_CONTENT_COLUMNS, BOOSTER_WEIGHT_COLUMNS and BOOSTER_SHEET_COLUMNS.
+    booster_sheet_rows is optional. The per-set weight totals are computed here. Returns the table manifests.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    tables = {}
+    tables["cards"] = _write_table(
+        path, "cards", card_columns, card_rows, indexes=["name"]
+    )
+    tables["setboostersheetcards"] = _write_table(
+        path, "setboostersheetcards", SHEET_CARD_COLUMNS, sheet_rows, indexes=["carduuid"]
+    )
+    tables["setboostercontents"] = _write_table(
+        path, "setboostercontents", BOOSTER_CONTENT_COLUMNS, content_rows
+    )
+    tables["setboostercontentweights"] = _write_table(
+        path, "setboostercontentweights", BOOSTER_WEIGHT_COLUMNS, weight_rows
+    )
+    if booster_sheet_rows is not None:
+        tables["setboostersheets"] = _write_table(
+            path, "setboostersheets", BOOSTER_SHEET_COLUMNS, booster_sheet_rows, indexes=["setcode"]
+        )
+    tables["boostertotals"] = _write_table(
+        path,
+        "boostertotals",
+        ["setcode", "boostername", "total"],
+        _sum_by(weight_rows, [3, 0], 2),
+        indexes=["setcode"],
+    )
+    tables["sheettotals"] = _write_table(
+        path,
+        "sheettotals",
+        ["setcode", "sheetname", "boostername", "total"],
+        _sum_by(sheet_rows, [3, 4, 0], 2),
+        indexes=["setcode"],
+    )
+
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump({"format": SNAPSHOT_FORMAT, "version": version, "tables": tables}, f, indent=2)
+
+    return tables
+
+
+def export_snapshot(path: str, extra_fields=(), version: Optional[str] = None):
+    """
+    Writes the cards, setboostersheetcards, setboostercontents and setboostercontentweights tables,
+    setboostersheets when the database has it, plus the per-set weight totals, from the database into a
+    snapshot directory.
+    version defaults to the database's stamp, see setchecker.dataset_version.
+    """
+    from setchecker import _card_columns, _fetch_query, dataset_version, my_logger
+
+    if version is None:
+        version = dataset_version()
+    card_columns = list(dict.fromkeys(_card_columns(extra_fields).values()))
+    booster_sheet_rows = None
+    if _fetch_query("SELECT to_regclass('setboostersheets') IS NOT NULL")[0][0]:
+        booster_sheet_rows = _fetch_query(
+            f"SELECT {', '.join(BOOSTER_SHEET_COLUMNS)} FROM setboostersheets"
+        )
+
+    tables = write_snapshot(
+        path,
+        card_columns,
+        _fetch_query(f"SELECT {', '.join(card_columns)} FROM cards"),
+        _fetch_query(f"SELECT {', '.join(SHEET_CARD_COLUMNS)} FROM setboostersheetcards"),
+        _fetch_query(f"SELECT {', '.join(BOOSTER_CONTENT_COLUMNS)} FROM setboostercontents"),
+        _fetch_query(
+            f"SELECT {', '.join(BOOSTER_WEIGHT_COLUMNS)} FROM setboostercontentweights"
+        ),
+        version=version,
+        booster_sheet_rows=booster_sheet_rows,
+    )
+
+    my_logger.info(
+        f"Exported snapshot to {path}: "
+        + ", ".join(f"{table} {manifest['rows']} rows" for table, manifest in tables.items())
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exports the MTGJSON tables into a local snapshot.")
+    parser.add_argument("path", help="snapshot directory to write")
+    parser.add_argument(
+        "--extra-fields",
+        nargs="*",
+        default=[],
+        help="optional CardSet fields to include, see setchecker.OPTIONAL_CARD_COLUMNS",
+    )
+    parser.add_argument(
+        "--version",
+        help="dataset version stamp stored in the manifest, defaults to the stamp of the database",
+    )
+    args = parser.parse_args()
+
+    export_snapshot(args.path, extra_fields=args.extra_fields, version=args.version)
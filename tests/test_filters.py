@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from filters import Has, Is, LIST_FILTER_FIELDS, SCALAR_FILTER_FIELDS, parse_filter
+
+# Postgres DSN the SQL form of the filters is evaluated against, those tests are skipped without it.
+TEST_DSN = os.getenv("SETCHECKER_TEST_DSN")
+
+FIELDS = sorted(LIST_FILTER_FIELDS | SCALAR_FILTER_FIELDS)
+
+# Card rows as the cards table holds them, lists as comma separated text and missing values as NULL.
+CARDS = [
+    dict(types="Creature", availability="paper,mtgo", finishes="nonfoil,foil", language="English",
+         border_color="black", rarity="common"),
+    dict(types="Artifact,Creature", availability="mtgo", finishes="foil", language="Japanese",
+         border_color="borderless", rarity="rare"),
+    dict(types="Land", availability="", finishes="nonfoil", language=None, border_color="black", rarity=None),
+    dict(types=None, availability=None, finishes=None, language=None, border_color=None, rarity=None),
+]
+
+FILTERS = [
+    Has("types", "Creature"),
+    Has("types", "Land", "Artifact"),
+    Has("availability", "paper"),
+    Has("finishes", "etched"),
+    Is("language", "English"),
+    Is("border_color", "black", "borderless"),
+    ~Has("types", "Land"),
+    ~Is("language", "English"),
+    Has("availability", "paper") & Is("language", "English"),
+    Has("finishes", "foil") | Is("rarity", "common"),
+    ~(Has("types", "Creature") | Is("rarity", "rare")),
+    parse_filter("types!=Creature,Land"),
+    parse_filter("language=Japanese"),
+]
+
+
+def _row(card):
+    return {field: card.get(field) for field in FIELDS}
+
+
+def test_parse_filter():
+    assert repr(parse_filter("types=Creature, Land")) == "Has('types', 'Creature', 'Land')"
+    assert repr(parse_filter("border-color!=borderless")) == "~Is('border_color', 'borderless')"
+
+
+@pytest.mark.parametrize("spec", ["types", "types=", "language=,"])
+def test_parse_filter_rejects_malformed_specs(spec):
+    with pytest.raises(ValueError, match="not of the form"):
+        parse_filter(spec)
+
+
+@pytest.mark.parametrize("spec", ["foo=bar", "is_online_only=true"])
+def test_parse_filter_rejects_unknown_fields(spec):
+    with pytest.raises(ValueError, match="Unknown filter field") as error:
+        parse_filter(spec)
+    assert all(field in str(error.value) for field in FIELDS)
+
+
+def test_null_columns_never_match_a_leaf_filter():
+    null_card = _row({})
+    assert not Has("types", "Creature").matches(null_card)
+    assert not Is("language", "English").matches(null_card)
+    assert (~Has("types", "Creature")).matches(null_card)
+
+
+@pytest.mark.skipif(not TEST_DSN, reason="SETCHECKER_TEST_DSN is not set")
+@pytest.mark.parametrize("card_filter", FILTERS, ids=repr)
+def test_sql_agrees_with_matches(card_filter):
+    psycopg2 = pytest.importorskip("psycopg2")
+    connection = psycopg2.connect(TEST_DSN)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE cards (id integer, "
+                + ", ".join(f"{field} text" for field in FIELDS)
+                + ")"
+            )
+            for card_id, card in enumerate(CARDS):
+                row = _row(card)
+                cursor.execute(
+                    f"INSERT INTO cards VALUES (%s{', %s' * len(FIELDS)})",
+                    [card_id, *(row[field] for field in FIELDS)],
+                )
+            clause, parameters = card_filter.sql({field: field for field in FIELDS})
+            cursor.execute(f"SELECT id FROM cards WHERE {clause} ORDER BY id", parameters)
+            selected = [card_id for card_id, in cursor.fetchall()]
+    finally:
+        connection.close()
+
+    assert selected == [card_id for card_id, card in enumerate(CARDS) if card_filter.matches(_row(card))]
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from scryfall import ScryfallClient, TokenBucket
+
+PAGE_SIZE = 3
+PAGES = 3
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Scryfall search stub: "Missing" answers 404, "Busy" answers 429 with Retry-After: 1 on the first request,
+    "Big" spreads its printings over PAGES pages, every other name has one page.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)
+        name = query["q"][0].strip('!"')
+        page = int(query.get("page", ["1"])[0])
+        with server.lock:
+            server.hits.append((time.monotonic(), name, page))
+            first = name not in server.seen
+            server.seen.add(name)
+
+        if name == "Missing":
+            self._reply(404, {"object": "error", "code": "not_found"})
+        elif name == "Busy" and first:
+            self._reply(429, {"object": "error"}, {"Retry-After": "1"})
+        else:
+            pages = PAGES if name == "Big" else 1
+            data = [
+                {"name": name, "collector_number": str((page - 1) * PAGE_SIZE + i)}
+                for i in range(PAGE_SIZE)
+            ]
+            result = {"object": "list", "has_more": page < pages, "data": data}
+            if page < pages:
+                result["next_page"] = (
+                    f"http://127.0.0.1:{server.server_port}/cards/search"
+                    f"?q={query['q'][0]}&unique=prints&page={page + 1}"
+                )
+            self._reply(200, result)
+
+    def _reply(self, status, body, headers=None):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.hits = []
+    server.seen = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub):
+    client = ScryfallClient(base_url=f"http://127.0.0.1:{stub.server_port}", rate=100, backoff=0.01)
+    yield client
+    client.close()
+
+
+def test_pages_follow_next_page(client, stub):
+    pages = list(client.pages(client.search_prints("Big")))
+
+    assert len(pages) == PAGES
+    numbers = [card["collector_number"] for page in pages for card in page["data"]]
+    assert numbers == [str(i) for i in range(PAGES * PAGE_SIZE)]
+    assert [page for _, name, page in stub.hits] == list(range(1, PAGES + 1))
+
+
+def test_single_page(client):
+    pages = list(client.pages(client.search_prints("Small")))
+
+    assert len(pages) == 1
+    assert len(pages[0]["data"]) == PAGE_SIZE
+
+
+def test_not_found_returns_none(client):
+    assert client.search_prints("Missing") is None
+    assert list(client.pages(None)) == []
+    assert client.retries == 0
+
+
+def test_retry_after_pauses_every_thread(client, stub):
+    start = time.monotonic()
+    results = list(client.map(client.search_prints, ["Busy"] + [f"Card {i}" for i in range(20)]))
+
+    assert all(result and result["data"] for result in results)
+    assert client.retries == 1
+
+    # Other threads keep going until the 429 arrives, none may start a request during the Retry-After.
+    throttled_at = next(hit for hit, name, _ in stub.hits if name == "Busy")
+    retried_at = [hit for hit, name, _ in stub.hits if name == "Busy"][1]
+    assert retried_at - throttled_at >= 1.0
+    assert not [
+        name for hit, name, _ in stub.hits if throttled_at + 0.1 < hit < throttled_at + 0.9
+    ]
+    assert time.monotonic() - start >= 1.0
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(rate=1000)
+    bucket.pause(0.2)
+
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.2
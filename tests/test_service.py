@@ -0,0 +1,123 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("aiohttp")
+asyncpg = pytest.importorskip("asyncpg")
+from aiohttp.test_utils import TestClient, TestServer
+
+from service import DeckService, create_app
+
+# Postgres DSN of a loaded MTGJSON database, the tests against Postgres are skipped without it.
+TEST_DSN = os.getenv("SETCHECKER_TEST_DSN")
+
+
+class FakePool:
+    """
+    Stands in for the asyncpg pool: answers every cards query with one printing per requested name, slowly enough
+    for concurrent lookups to overlap.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.queries = []
+
+    async def fetch(self, query, card_names, *parameters):
+        self.queries.append(card_names)
+        await asyncio.sleep(0.05)
+        rows = []
+        for card_name in card_names:
+            card = {field: None for field in self.columns}
+            card.update(
+                name=card_name, set_code="TST", uuid=f"{card_name}-uuid", types="Creature"
+            )
+            rows.append(tuple(card[field] for field in self.columns))
+        return rows
+
+    async def close(self):
+        pass
+
+
+class FakeDeckService(DeckService):
+    async def start(self):
+        self.pool = FakePool(self.columns)
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_lookups_share_one_query():
+    async def run():
+        service = FakeDeckService()
+        await service.start()
+        results = await asyncio.gather(*(service.fetch_copies(["Sol Ring"]) for _ in range(10)))
+        return service, results
+
+    service, results = _run(run())
+
+    assert service.queries == 1
+    assert service.coalesced == 9
+    assert all(len(result["Sol Ring"]) == 1 for result in results)
+
+
+def test_cancelled_request_does_not_fail_the_others():
+    async def run():
+        service = FakeDeckService()
+        await service.start()
+        cancelled = asyncio.create_task(service.fetch_copies(["Sol Ring"]))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(service.fetch_copies(["Sol Ring"]))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        return await waiting
+
+    assert len(_run(run())["Sol Ring"]) == 1
+
+
+def test_http_api():
+    async def run():
+        async with TestClient(TestServer(create_app(FakeDeckService()))) as client:
+            ok = await client.post("/decks", json={"deck": "1 Sol Ring\n2 Counterspell"})
+            result = await ok.json()
+
+            statuses = []
+            for body in ["{not json", "[1]", '"1 Sol Ring"', '{"deck": 3}']:
+                response = await client.post(
+                    "/decks", data=body, headers={"Content-Type": "application/json"}
+                )
+                statuses.append(response.status)
+
+            stats = await (await client.get("/stats")).json()
+            return ok.status, result, statuses, stats
+
+    status, result, statuses, stats = _run(run())
+
+    assert status == 200
+    assert result["Sets"] == {"TST": 2}
+    assert statuses == [400, 400, 400, 400]
+    assert stats["Requests"] == 1
+    assert set(stats["LatencyMs"]) == {"P50", "P90", "P99"}
+    assert stats["LatencyMs"]["P50"] is not None
+
+
+@pytest.mark.skipif(not TEST_DSN, reason="SETCHECKER_TEST_DSN is not set")
+def test_coalescing_against_postgres():
+    async def run():
+        service = DeckService(dsn=TEST_DSN)
+        await service.start()
+        try:
+            card_name = await service.pool.fetchval("SELECT name FROM cards LIMIT 1")
+            results = await asyncio.gather(
+                *(service.fetch_copies([card_name]) for _ in range(10))
+            )
+            return service, card_name, results
+        finally:
+            await service.close()
+
+    service, card_name, results = _run(run())
+
+    assert service.queries == 1
+    assert service.coalesced == 9
+    assert all(result == results[0] for result in results)
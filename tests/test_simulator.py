@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import pytest
+
+from schemas import BoosterPack, SheetCard
+from setchecker import CalculateDropChance
+from simulator import simulate_boosters, simulate_sets
+
+SET_CODE = "TST"
+BOOSTER = "draft"
+
+# Booster index -> (booster weight, {sheet name: picks}), the weights add up to 4.
+VARIANTS = {
+    0: (3, {"common": 10}),
+    1: (1, {"common": 9, "foil": 1}),
+}
+# Sheet name -> total sheet weight.
+SHEET_WEIGHTS = {"common": 20, "foil": 10}
+
+
+def _printing(uuid, name, card_weights):
+    """
+    A printing of the test set with the CardSet fields the simulator and CalculateDropChance read.
+    card_weights maps the sheets holding the printing to its weight on them.
+    """
+    booster_packs = [
+        BoosterPack(
+            set_code=SET_CODE,
+            booster_name=BOOSTER,
+            booster_index=index,
+            booster_weight=weight,
+            sheet_name=sheet_name,
+            sheet_picks=picks,
+            booster_weight_ratio=weight / 4,
+        )
+        for index, (weight, sheets) in VARIANTS.items()
+        for sheet_name, picks in sheets.items()
+        if sheet_name in card_weights
+    ]
+    sheet_cards = {
+        (BOOSTER, sheet_name): SheetCard(
+            set_code=SET_CODE,
+            booster_name=BOOSTER,
+            card_uuid=uuid,
+            card_weight=card_weight,
+            sheet_name=sheet_name,
+            sheet_weight=SHEET_WEIGHTS[sheet_name],
+        )
+        for sheet_name, card_weight in card_weights.items()
+    }
+    return SimpleNamespace(
+        uuid=uuid,
+        name=name,
+        set_code=SET_CODE,
+        boosters={BOOSTER: {"BoosterPacks": booster_packs}},
+        sheet_cards=sheet_cards,
+    )
+
+
+@pytest.fixture
+def cards():
+    return [
+        _printing("a", "Alpha", {"common": 1}),
+        _printing("b", "Beta", {"common": 2, "foil": 1}),
+    ]
+
+
+def test_simulate_boosters_is_reproducible(cards):
+    first = simulate_boosters(cards, BOOSTER, boosters=5_000, trials=50, seed=7)
+    second = simulate_boosters(cards, BOOSTER, boosters=5_000, trials=50, seed=7)
+
+    assert first == second
+
+
+def test_simulate_sets_is_reproducible(cards):
+    set_counts = {SET_CODE: {"Cards": cards}}
+    deck_data = [(2, "Alpha"), (1, "Beta")]
+
+    first = simulate_sets(set_counts, [SET_CODE], deck_data, boosters=5_000, seed=7)
+    second = simulate_sets(set_counts, [SET_CODE], deck_data, boosters=5_000, seed=7)
+
+    assert first == second
+    assert list(first) == [(SET_CODE, BOOSTER)]
+
+
+def test_expected_copies_match_drop_chance(cards):
+    result = simulate_boosters(cards, BOOSTER, boosters=200_000, trials=10, seed=1)
+    drop_chances = CalculateDropChance(cards)["Printings"]
+
+    # Alpha: 3/4 * 10 * 1/20 + 1/4 * 9 * 1/20, Beta: 3/4 * 10 * 2/20 + 1/4 * (9 * 2/20 + 1 * 1/10)
+    assert drop_chances[("a", BOOSTER)] == pytest.approx(0.4875)
+    assert drop_chances[("b", BOOSTER)] == pytest.approx(1.0)
+    for card in cards:
+        assert result["ExpectedCopies"][card.name] == pytest.approx(
+            drop_chances[(card.uuid, BOOSTER)], rel=0.02
+        )
+    assert result["Unobtainable"] == []